@@ -18,26 +18,82 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
-import importlib
+# Header definitions are declared in headers.json. Further *.json files
+# dropped into this directory are read after it, in sorted order, and add
+# headers or replace those with the same name. An entry may list glob
+# patterns of the platform 'compatible' strings it applies to; entries
+# without one apply to all platforms.
+
+import fnmatch
+import glob
+import json
 import os
+from Jetson import header_def
+
+
+_path = os.path.dirname(os.path.abspath(__file__))
+_entries = None
+
+
+def _load():
+    global _entries
+
+    if _entries is not None:
+        return _entries
+
+    files = [os.path.join(_path, 'headers.json')]
+    files += sorted(f for f in glob.glob(os.path.join(_path, '*.json'))
+                    if f not in files)
+    entries = {}
+    for path in files:
+        with open(path, 'r') as f:
+            for entry in json.load(f):
+                for key in ['name', 'prefix', 'pin_count', 'static_pins']:
+                    if key not in entry:
+                        raise RuntimeError("Header definition without '%s' "
+                                           "in %s!" % (key, path))
+                entries.pop(entry['name'], None)
+                entries[entry['name']] = entry
+
+    defaults = [e['name'] for e in entries.values() if e.get('default')]
+    if len(defaults) > 1:
+        raise RuntimeError("More than one header set to 'default'!")
+
+    # Default header is placed at the top of the list, so it will be
+    # displayed at the top of the GUI menu and the cursor will be over
+    # it. The CLI scripts can access the default header as header no. 1
+    _entries = [e for e in entries.values() if e.get('default')] + \
+               [e for e in entries.values() if not e.get('default')]
+    return _entries
+
+
+def _is_compatible(entry, compat):
+    if compat is None or 'compatible' not in entry:
+        return True
+    for c in compat:
+        for pattern in entry['compatible']:
+            if fnmatch.fnmatchcase(c, pattern):
+                return True
+    return False
+
+
+def get_names(compat=None):
+    # Names of the headers applicable to the platform, default first
+    return [e['name'] for e in _load() if _is_compatible(e, compat)]
 
 
-HDRS = []
-_default = False
-
-
-for module in sorted(os.listdir(os.path.dirname(__file__))):
-    if module == '__init__.py' or not module.endswith('.py'):
-        continue
-    module = '.' + os.path.splitext(module)[0]
-    hdr = importlib.import_module(module, 'Headers')
-    if hdr.HDR.default:
-        if _default:
-            raise RuntimeError("More than one header set to 'default'!")
-        # Default header is placed at the top of the list, so it will be
-        # displayed at the top of the GUI menu and the cursor will be over
-        # it. The CLI scripts can access the default header as header no. 1
-        HDRS.insert(0, hdr.HDR)
-        _default = True
-    else:
-        HDRS.append(hdr.HDR)
+def get_headers(compat=None, names=None):
+    # Header definitions of the headers applicable to the platform, limited
+    # to the given names if any, default first
+    hdrs = []
+    for entry in _load():
+        if not _is_compatible(entry, compat):
+            continue
+        if names is not None and entry['name'] not in names:
+            continue
+        static_pins = dict((int(idx), label)
+                           for idx, label in entry['static_pins'].items())
+        hdrs.append(header_def.HeaderDef(entry['name'], entry['prefix'],
+                                         entry['pin_count'], static_pins,
+                                         entry.get('default', False)))
+    return hdrs
@@ -0,0 +1,254 @@
+# SPDX-FileCopyrightText: Copyright (c) 2019-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Pin configuration of many boards as a columnar table, for questions such
+# as which units use hdr40 pin 32 as pwm or which units drifted from an
+# approved configuration. Every row is a header pin of a unit; string
+# columns are dictionary encoded, so all columns are arrays of integers.
+# Filters compare codes over whole columns and combine the resulting byte
+# masks as integers, and selections compress every column with a mask.
+
+from Jetson import fleet
+import array
+import collections
+import concurrent.futures
+import itertools
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+
+
+COLUMNS = ['unit', 'header', 'pin', 'name', 'function', 'enabled',
+           'default', 'configurable', 'source']
+
+# Typecodes of the integer columns, the others are dictionary encoded
+_typecodes = {'pin': 'H', 'enabled': 'B', 'default': 'B',
+              'configurable': 'B'}
+
+_magic = b'JIOCOL1\n'
+
+
+def _is_encoded(column):
+    return column not in _typecodes
+
+
+def _and(a, b):
+    return (int.from_bytes(a, 'little') &
+            int.from_bytes(b, 'little')).to_bytes(len(a), 'little')
+
+
+class Table(object):
+    def __init__(self):
+        self.columns = dict((c, array.array(_typecodes.get(c, 'I')))
+                            for c in COLUMNS)
+        # Strings of the encoded columns by code, and codes by string
+        self.values = dict((c, []) for c in COLUMNS if _is_encoded(c))
+        self.codes = dict((c, {}) for c in COLUMNS if _is_encoded(c))
+
+    def __len__(self):
+        return len(self.columns['pin'])
+
+    def _encode(self, column, value):
+        code = self.codes[column].get(value)
+        if code is None:
+            code = len(self.values[column])
+            self.values[column].append(value)
+            self.codes[column][value] = code
+        return code
+
+    def append(self, row):
+        for column in COLUMNS:
+            value = row[column]
+            if _is_encoded(column):
+                value = self._encode(column, value)
+            self.columns[column].append(int(value))
+
+    def extend(self, table):
+        # Appends the rows of another table, translating its codes
+        for column in COLUMNS:
+            if _is_encoded(column):
+                codes = [self._encode(column, v)
+                         for v in table.values[column]]
+                self.columns[column].extend(
+                    map(codes.__getitem__, table.columns[column]))
+            else:
+                self.columns[column].extend(table.columns[column])
+
+    def get(self, column):
+        if _is_encoded(column):
+            return list(map(self.values[column].__getitem__,
+                            self.columns[column]))
+        return self.columns[column].tolist()
+
+    def rows(self):
+        columns = [self.get(c) for c in COLUMNS]
+        for values in zip(*columns):
+            yield dict(zip(COLUMNS, values))
+
+    def mask(self, column, value):
+        # Byte per row, 1 where the column equals the value (or one of the
+        # values, given a list)
+        if column not in self.columns:
+            raise NameError("Unknown column %s!" % column)
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        if _is_encoded(column):
+            codes = set(self.codes[column][v] for v in values
+                        if v in self.codes[column])
+        else:
+            codes = set(int(v) for v in values)
+        return bytes(map(codes.__contains__, self.columns[column]))
+
+    def select(self, mask):
+        table = Table()
+        for column in COLUMNS:
+            table.columns[column] = array.array(
+                self.columns[column].typecode,
+                itertools.compress(self.columns[column], mask))
+            if _is_encoded(column):
+                table.values[column] = list(self.values[column])
+                table.codes[column] = dict(self.codes[column])
+        return table
+
+    def filter(self, **conditions):
+        mask = b'\x01' * len(self)
+        for column, value in conditions.items():
+            mask = _and(mask, self.mask(column, value))
+        return self.select(mask)
+
+    def count_by(self, *columns):
+        # {(values of the columns): number of rows}
+        return collections.Counter(zip(*[self.get(c) for c in columns]))
+
+    def distinct(self, column):
+        return sorted(set(self.get(column)))
+
+    def save(self, path):
+        header = {'rows': len(self), 'byteorder': sys.byteorder,
+                  'columns': [[c, self.columns[c].typecode]
+                              for c in COLUMNS],
+                  'values': self.values}
+        data = json.dumps(header).encode()
+        temp = '%s.%d.tmp' % (path, os.getpid())
+        with open(temp, 'wb') as f:
+            f.write(_magic)
+            f.write(struct.pack('<I', len(data)))
+            f.write(data)
+            for column in COLUMNS:
+                self.columns[column].tofile(f)
+        os.replace(temp, path)
+
+    @staticmethod
+    def load(path):
+        table = Table()
+        with open(path, 'rb') as f:
+            if f.read(len(_magic)) != _magic:
+                raise RuntimeError("%s is not a pin table!" % path)
+            size = struct.unpack('<I', f.read(4))[0]
+            header = json.loads(f.read(size).decode())
+            for column, typecode in header['columns']:
+                values = array.array(typecode)
+                values.fromfile(f, header['rows'])
+                if header['byteorder'] != sys.byteorder:
+                    values.byteswap()
+                table.columns[column] = values
+        for column, values in header['values'].items():
+            table.values[column] = values
+            table.codes[column] = dict((v, i) for i, v in enumerate(values))
+        return table
+
+
+def concat(tables):
+    table = Table()
+    for t in tables:
+        table.extend(t)
+    return table
+
+
+def export_board(jetson, unit):
+    # Rows of the pins of every header of the board. The source of a pin
+    # is the DTBO generated by jetson-io if the pin was configured by an
+    # earlier session, else the header overlay
+    table = Table()
+    for hdr in jetson.get_board_headers():
+        header = jetson.load_header(hdr)
+        pins = header.pins
+        overlay = jetson.board_headers[hdr].hdtbos
+        custom = "jetson-io-%s-user-custom.dtbo" % header.prefix
+        for pin_num in sorted(pins.names.keys()):
+            name = pins.names[pin_num]
+            # Static pins (supplies and grounds) have no pin node
+            if name not in pins.nodes:
+                continue
+            configurable = pins.is_configurable(name)
+            if configurable:
+                function = pins.get_function(name)
+                enabled = pins.is_enabled(name)
+                default = pins.is_default(name)
+            else:
+                function = pins.get_label(name)
+                enabled = default = True
+            if header.pin_configured_by_dt(name):
+                source = custom
+            else:
+                source = os.path.basename(overlay) if overlay else ''
+            table.append({'unit': unit, 'header': header.prefix,
+                          'pin': pin_num, 'name': name,
+                          'function': function or '', 'enabled': enabled,
+                          'default': default, 'configurable': configurable,
+                          'source': source})
+    return table
+
+
+def _export_snapshot(snapshot, lockdir):
+    jetson = fleet.open_snapshot(snapshot, lockdir, readonly=True)
+    return export_board(jetson, fleet.get_name(snapshot))
+
+
+def export_snapshots(snapshots, jobs=None):
+    # Exports the snapshots of fleet.capture() on a pool of worker
+    # processes and returns a single table
+    lockdir = tempfile.mkdtemp(prefix='jetson-io-analytics-')
+    try:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+            tables = executor.map(_export_snapshot, snapshots,
+                                  [lockdir] * len(snapshots))
+            return concat(tables)
+    finally:
+        shutil.rmtree(lockdir, ignore_errors=True)
+
+
+def drift(table, reference):
+    # Rows of the table whose function or state differs from the row of
+    # the same header pin in the reference, e.g. the approved unit
+    expected = {}
+    for row in reference.rows():
+        expected[(row['header'], row['pin'])] = \
+            (row['function'], row['enabled'])
+    headers = table.values['header']
+    functions = table.values['function']
+    mask = bytes(expected.get((headers[h], p), (functions[f], e)) !=
+                 (functions[f], e) for h, p, f, e in
+                 zip(table.columns['header'], table.columns['pin'],
+                     table.columns['function'], table.columns['enabled']))
+    return table.select(mask)
@@ -21,28 +21,67 @@
 
 from Linux import dt
 from Linux import extlinux
+from Jetson import cameras
 from Jetson import header
+from Jetson import overlays
 from Jetson import pmx
+from Utils import cache
 from Utils import dtc
 from Utils import fio
+from Utils import lock
+from Utils import perf
 from Utils import syscall
+from Utils import tasks
 import Headers
 import datetime
 import glob
 import os
 import re
 import shutil
+import threading
+
+
+_dev_block_path = '/dev/block'
+_mnt_path = '/mnt'
+_rootfs_slots = ['APP', 'APP_b']
+_overlay_props = ['compatible', 'jetson-header-name', 'overlay-name']
+
+
+def _board_get_overlay_props(dtbos):
+    # Root properties of the overlays as {prop: value}, kept in the
+    # persistent overlay index
+    def read(dtbos):
+        values = [dtc.get_prop_values(dtbos, '/', prop, 0)
+                  for prop in _overlay_props]
+        return [dict(zip(_overlay_props, v)) for v in zip(*values)]
+    return cache.overlays.get_many(dtbos, read)
+
+
+def _board_find_dtbos(compat, path):
+    # Same as dtc.find_compatible_dtbo_files(), using the overlay index
+    dtbos = []
+    files = sorted(glob.glob(os.path.join(path, '*.dtbo')))
+    for dtbo, props in zip(files, _board_get_overlay_props(files)):
+        if props['compatible'] is None:
+            continue
+        for c_str in props['compatible'].split():
+            if c_str in compat:
+                dtbos.append(dtbo)
+                break
+    return dtbos
 
 
 def _board_find_overlays(dtbos, hdr_names, hdtbos, hw_addons):
-    for dtbo in dtbos:
+    props = _board_get_overlay_props(dtbos)
+    jetson_headers = [p['jetson-header-name'] for p in props]
+    overlay_names = [p['overlay-name'] for p in props]
+
+    for dtbo, header, overlay in zip(dtbos, jetson_headers, overlay_names):
         # HW addon overlays
-        header = dtc.get_prop_value(dtbo, '/', 'jetson-header-name', 0)
         if header in hdr_names:
             if header not in hw_addons.keys():
                 hw_addons[header] = {}
 
-            overlay = dtc.get_prop_value(dtbo, '/', 'overlay-name', 0)
             if overlay is None:
                 error = "overlay-name not specified in %s!\n" % dtbo
                 raise RuntimeError(error)
@@ -60,7 +99,7 @@ def _board_find_overlays(dtbos, hdr_names, hdtbos, hw_addons):
             continue
 
         # Header overlays
-        header = dtc.get_prop_value(dtbo, '/', 'overlay-name', 0)
+        header = overlay
         if header in hdtbos.keys() and hdtbos[header]:
             error = "Multiple DT overlays for '%s' found!\n" % header
             error = error + "Please remove duplicate(s)"
@@ -73,16 +112,17 @@ def _board_find_overlays(dtbos, hdr_names, hdtbos, hw_addons):
                 hw_addons[header] = {}
 
 
-def _board_get_jetson_io_pinmux_pins(hdr_prefixes):
+def _board_get_jetson_io_pinmux_pins(hdr_prefixes=None):
     # This tool writes the pinmux nodes for modified pins at the
     # below location in the platform DTB file. These need to be
     # read so that changes made in earlier sessions of this tool
     # (in earlier boot cycles) are retained, in case these pins
-    # are not touched in the current session.
+    # are not touched in the current session. Without hdr_prefixes,
+    # the pins of all headers are returned.
     properties = '__symbols__/jetson_io_pinmux', \
                 '__symbols__/jetson_io_pinmux_aon'
 
-    preconf_pins = dict.fromkeys(hdr_prefixes, None)
+    preconf_pins = dict.fromkeys(hdr_prefixes or [], None)
 
     for prop in properties:
         if not dt.prop_exists(prop):
@@ -98,10 +138,10 @@ def _board_get_jetson_io_pinmux_pins(hdr_prefixes):
                 continue
 
             prefix = str(res.groups()[0])
-            if prefix not in hdr_prefixes:
+            if hdr_prefixes is not None and prefix not in hdr_prefixes:
                 continue
 
-            if preconf_pins[prefix] is None:
+            if preconf_pins.get(prefix) is None:
                 preconf_pins[prefix] = []
 
             pin_name_prop = '/'.join((path, node, 'nvidia,pins'))
@@ -113,14 +153,15 @@ def _board_get_jetson_io_pinmux_pins(hdr_prefixes):
 
 
 def _board_root_partition_is_block_device():
-    dev = syscall.call_out('mountpoint -q -d /')
+    dev = syscall.call_out(['mountpoint', '-q', '-d', '/'])
     if not dev or len(dev) != 1:
         raise RuntimeError("Root partition not found!")
-    return os.path.exists("/dev/block/%s" % dev[0])
+    return os.path.exists(os.path.join(_dev_block_path, dev[0]))
 
 
 def _board_root_partition_get_partlabel():
-    entries = syscall.call_out('lsblk -n -r -o mountpoint,partlabel')
+    entries = syscall.call_out(['lsblk', '-n', '-r', '-o',
+                                'mountpoint,partlabel'])
     for entry in entries:
         mountpoint,label = entry.split(' ')
         if mountpoint == '/':
@@ -130,19 +171,30 @@ def _board_root_partition_get_partlabel():
 
 def _board_partition_exists(partlabel):
     numparts = 0
-    partlabels = syscall.call_out('lsblk -n -r -o partlabel')
+    partlabels = syscall.call_out(['lsblk', '-n', '-r', '-o', 'partlabel'])
     for p in partlabels:
         if p == partlabel:
             numparts += 1
     return numparts
 
 
-def _board_partition_is_root_mountpoint(partlabel):
+def _board_root_partition_get_label():
+    # Partition label of the root partition, None if it is not mounted
+    # from a block device (e.g. NFS)
     if not _board_root_partition_is_block_device():
-        return False
-    if _board_root_partition_get_partlabel() == partlabel:
-        return True
-    return False
+        return None
+    return _board_root_partition_get_partlabel()
+
+
+def _board_get_active_partlabel():
+    #Finding the active partition in case of redundant rootfs flash.
+    activepart = syscall.call_out(['nvbootctrl', '-t', 'rootfs',
+                                   'get-current-slot'])
+    if activepart[0] == '0':
+        return "APP"
+    elif activepart[0] == '1':
+        return "APP_b"
+    raise RuntimeError("Failed to get active rootfs partition!")
 
 def _board_get_dtb(compat, model, path):
     dtbs = dtc.find_compatible_dtb_files(compat, model, path)
@@ -153,48 +205,192 @@ def _board_get_dtb(compat, model, path):
         raise RuntimeError("Multiple DTBs found for %s!" % model)
     return dtbs[0]
 
+def _board_find_dtb(compat, model, path):
+    # Read-only boards use the DTB of the root partition, if there is a
+    # single one, to check the overlays against
+    try:
+        return _board_get_dtb(compat, model, path)
+    except RuntimeError:
+        return None
+
+
+def _board_mount_users(mountpoint):
+    # PIDs of the live processes using a partition mounted by this tool,
+    # or None if the mountpoint was not created by this tool
+    refs = mountpoint + '.refs'
+    if not os.path.exists(refs):
+        return None
+    users = []
+    with open(refs, 'r') as f:
+        for line in f:
+            try:
+                os.kill(int(line), 0)
+            except (ValueError, ProcessLookupError):
+                continue
+            except PermissionError:
+                pass
+            users.append(int(line))
+    return users
+
+
+def _board_mount_set_users(mountpoint, users):
+    refs = mountpoint + '.refs'
+    if not users:
+        if os.path.exists(refs):
+            os.remove(refs)
+        return
+    with open(refs, 'w') as f:
+        f.write(''.join('%d\n' % pid for pid in users))
+
+
 def _board_partition_mount(partlabel):
-    numparts = _board_partition_exists(partlabel)
-    if numparts == 0:
-        raise RuntimeError("No %s partition found!" % partlabel)
-    elif numparts > 1:
-        raise RuntimeError("Multiple %s partitions found!" % partlabel)
-    path = os.path.join('/mnt', partlabel)
-    if os.path.exists(path):
-        raise RuntimeError("Mountpoint %s already exists!" % path)
-    os.makedirs(path)
-    syscall.call('mount PARTLABEL="%s" "%s"' % (partlabel, path))
+    # The partition mount is shared by concurrent runs of the tool and
+    # reference counted, the last user unmounts it
+    path = os.path.join(_mnt_path, partlabel)
+    with lock.exclusive('jetson-io-mount'):
+        users = _board_mount_users(path)
+        if users is None or not os.path.ismount(path):
+            numparts = _board_partition_exists(partlabel)
+            if numparts == 0:
+                raise RuntimeError("No %s partition found!" % partlabel)
+            elif numparts > 1:
+                raise RuntimeError("Multiple %s partitions found!" %
+                                   partlabel)
+            # An empty directory left by an earlier run is reused
+            if os.path.exists(path) and \
+               (users is None or os.path.ismount(path) or os.listdir(path)):
+                raise RuntimeError("Mountpoint %s already exists!" % path)
+            os.makedirs(path, exist_ok=True)
+            syscall.call(['mount', 'PARTLABEL=%s' % partlabel, path])
+            users = []
+        _board_mount_set_users(path, users + [os.getpid()])
     return path
 
 
 def _board_partition_umount(mountpoint):
-    if syscall.call('umount "%s"' % mountpoint):
-        raise RuntimeError("Failed to umount %s!" % mountpoint)
-    os.rmdir(mountpoint)
+    with lock.exclusive('jetson-io-mount'):
+        users = _board_mount_users(mountpoint) or []
+        if os.getpid() in users:
+            users.remove(os.getpid())
+        _board_mount_set_users(mountpoint, users)
+        if users:
+            return
+        if syscall.call(['umount', mountpoint]):
+            raise RuntimeError("Failed to umount %s!" % mountpoint)
+        os.rmdir(mountpoint)
+
+
+def _board_dtbo_refers_to(ref, path):
+    return ref == path or ref.startswith(path + '/')
+
+
+def _board_dtbo_remove_node(dtbo, path):
+    # Removes a node from an overlay together with the __symbols__,
+    # __fixups__ and __local_fixups__ entries that refer to it, so
+    # that the overlay can still be applied
+    root_nodes = dtc.get_child_nodes(dtbo, '/')
+    dtc.remove_node(dtbo, path)
+    if '__local_fixups__' in root_nodes:
+        dtc.remove_node(dtbo, '/__local_fixups__' + path)
+
+    if '__symbols__' in root_nodes:
+        for symbol in dtc.get_child_props(dtbo, '/__symbols__'):
+            target = dtc.get_prop_value(dtbo, '/__symbols__', symbol, 0)
+            if _board_dtbo_refers_to(target, path):
+                dtc.delete_prop(dtbo, '/__symbols__', symbol)
+
+    if '__fixups__' in root_nodes:
+        for label in dtc.get_child_props(dtbo, '/__fixups__'):
+            refs = dtc.get_prop_value(dtbo, '/__fixups__', label, 0).split()
+            keep = [ref for ref in refs
+                    if not _board_dtbo_refers_to(ref.split(':')[0], path)]
+            if len(keep) == len(refs):
+                continue
+            if keep:
+                dtc.set_prop_values(dtbo, '/__fixups__', 's', label, keep)
+            else:
+                dtc.delete_prop(dtbo, '/__fixups__', label)
 
 
-def _board_load_headers(hdr_defs, dtbos):
+def _board_load_headers(compat, dtbos, preconf_pins):
     hdtbos = {}
     hw_addons = {}
     board_headers = {}
 
-    hdr_names_all = [hdr_def.name for hdr_def in hdr_defs]
+    hdr_names_all = Headers.get_names(compat)
     _board_find_overlays(dtbos, hdr_names_all, hdtbos, hw_addons)
 
-    # Pins already set thru Jetson-IO tool
-    hdr_prefixes = [hdr_def.prefix for hdr_def in hdr_defs]
-    preconf_pins = _board_get_jetson_io_pinmux_pins(hdr_prefixes)
+    # Only headers with an overlay on this board are constructed
+    hdr_defs = Headers.get_headers(compat, hdtbos.keys())
 
     for hdr_def in hdr_defs:
         hdr = hdr_def.name
         if hdr in hdtbos.keys():
             board_header = _BoardHeader(hdr_def, hdtbos[hdr], hw_addons[hdr],
-                                        preconf_pins[hdr_def.prefix])
+                                        preconf_pins.get(hdr_def.prefix))
             board_headers[hdr] = board_header
 
     return board_headers
 
 
+def warm_cache(bootdir='/boot/arducam/dts'):
+    # Indexes the overlays in bootdir and parses the pins of the header
+    # overlays of all platforms and the camera sensors of the overlays, so
+    # that the first run of the tool finds them in the persistent cache.
+    # Returns the number of overlays indexed, of header overlays parsed and
+    # of camera sensors found.
+    dtbos = sorted(glob.glob(os.path.join(bootdir, '*.dtbo')))
+    prefixes = dict((h.name, h.prefix) for h in Headers.get_headers())
+    hdtbos = []
+    addons = []
+    for dtbo, props in zip(dtbos, _board_get_overlay_props(dtbos)):
+        if props['jetson-header-name'] in prefixes:
+            addons.append((dtbo, prefixes[props['jetson-header-name']]))
+            continue
+        if props['overlay-name'] in prefixes:
+            hdtbos.append((dtbo, prefixes[props['overlay-name']]))
+
+    for dtbo, prefix in hdtbos:
+        header.get_pin_entries(dtbo, prefix)
+    for dtbo, prefix in addons:
+        header.get_addon_entries(dtbo, prefix)
+
+    index = cameras.get_index(dtbos)
+
+    for c in [cache.overlays, cache.templates, cache.cameras]:
+        if not c.save() and c.dirty:
+            raise RuntimeError("Failed to write cache in %s!" %
+                               cache.cache_dir)
+    return len(dtbos), len(hdtbos), \
+        sum(len(entry['sensors']) for entry in index.values())
+
+
+def _board_get_shared_pins(board_headers, pinmux):
+    # Index of the SoC pins of all headers and add-ons, from the cached pin
+    # entries of their overlays, see header.SharedPins
+    shared = header.SharedPins()
+    for hdr, board_header in board_headers.items():
+        prefix = board_header.hdr_def.prefix
+        if board_header.hdtbos:
+            for entry in header.get_pin_entries(board_header.hdtbos, prefix):
+                if entry[3] is not None:
+                    shared.add_pin(hdr, entry[2], entry[3])
+        for addon, dtbo in board_header.hw_addons.items():
+            for entry in header.get_addon_entries(dtbo, prefix):
+                if entry[2] is not None:
+                    shared.add_addon(hdr, addon, entry[2])
+
+        preconf = {}
+        for name in board_header.preconf_pins or []:
+            try:
+                if pinmux.pin_is_enabled(name):
+                    preconf[name] = pinmux.pin_get_function(name)
+            except RuntimeError:
+                continue
+        shared.set_preconf(hdr, preconf)
+    return shared
+
+
 class _BoardHeader(object):
     def __init__(self, hdr_def, hdtbos, hw_addons, preconf_pins):
         self.hdr_def = hdr_def
@@ -207,23 +403,72 @@ class _BoardHeader(object):
 
 
 class Board(object):
-    def __init__(self):
+    def __init__(self, bootdir='/boot/arducam/dts',
+                 extlinux='/boot/extlinux/extlinux.conf', readonly=False,
+                 offline=False):
+        with perf.span('Board.__init__'):
+            self._init(bootdir, extlinux, readonly, offline)
+
+    def _init(self, bootdir, extlinux, readonly, offline=False):
         self.appdir = None
-        #self.bootdir = '/boot'
-        self.bootdir = '/boot/arducam/dts'
-        self.extlinux = '/boot/extlinux/extlinux.conf'
-        dtbdir = os.path.join(self.bootdir, 'dtb')
-        fio.is_rw(self.bootdir)
-
-        #Finding the active partition in case of redundant rootfs flash.
-        activepart = syscall.call_out('nvbootctrl -t rootfs get-current-slot')
-        if activepart[0] == '0':
-            mountpart = "APP"
-        elif activepart[0] == '1':
-            mountpart = "APP_b"
+        self.slot = None
+        self.rootpart = None
+        self.bootdir = bootdir
+        self.extlinux = extlinux
+        self.readonly = readonly
+        self.offline = offline
+        self.header_lock = threading.Lock()
+
+        # Steps not depending on each other's results run concurrently; only
+        # the DTB lookup waits for the partition to be mounted
+        graph = tasks.Graph('Board.__init__')
+        graph.add('platform', lambda: (dt.read_prop('compatible'),
+                                       dt.read_prop('model')))
+        # A read-only board only queries the pin configuration, so it
+        # neither needs write access nor the active partition and DTB. An
+        # offline board is read from a snapshot (see capture-snapshot.py)
+        # and only has the DTB found in bootdir
+        if not readonly and not offline:
+            graph.add('bootdir rw', lambda: fio.is_rw(self.bootdir))
+            graph.add('rootfs slot', _board_get_active_partlabel)
+            graph.add('root partition', _board_root_partition_get_label)
+            graph.add('partition', self._mount_partition,
+                      ['rootfs slot', 'root partition'])
+            graph.add('find dtb', lambda dtbdir, platform: _board_get_dtb(
+                          platform[0], platform[1], dtbdir),
+                      ['partition', 'platform'])
         else:
-            raise RuntimeError("Failed to get active rootfs partition!")
-
+            graph.add('find dtb', lambda platform: _board_find_dtb(
+                          platform[0], platform[1],
+                          os.path.join(self.bootdir, 'dtb')),
+                      ['platform'])
+        graph.add('find dtbos', lambda platform:
+                      _board_find_dtbos(platform[0].split(), self.bootdir),
+                  ['platform'])
+        # Import pinmux
+        graph.add('pinmux', pmx.PinMux)
+        # Pins already set thru Jetson-IO tool
+        graph.add('preconf pins', _board_get_jetson_io_pinmux_pins)
+        # Load header definitions
+        graph.add('load headers', lambda platform, dtbos, preconf_pins:
+                      _board_load_headers(platform[0].split(), dtbos,
+                                          preconf_pins),
+                  ['platform', 'find dtbos', 'preconf pins'])
+        # Runs committing a configuration are waited for, other queries
+        # run in parallel
+        with lock.shared():
+            results = graph.run()
+
+        self.compat, self.model = results['platform']
+        self.dtb = results.get('find dtb')
+        self.pinmux = results['pinmux']
+        self.board_headers = results['load headers']
+        self.critical_path = graph.critical_path()
+        # Built with the first header, see get_shared_pins()
+        self.shared_pins = None
+        cache.overlays.save()
+
+    def _mount_partition(self, mountpart, rootpart):
         # When mounting the rootfs via NFS, the root partition is not a
         # block device. Furthermore, when booting with NFS the partition
         # that the bootloader reads to parse the extlinux.conf and load
@@ -231,22 +476,13 @@ class Board(object):
         # not mounted with the active partition, then it is necessary to
         # find and mount the active partition and copy the generated
         # files back to this partition.
-        if not _board_partition_is_root_mountpoint(mountpart):
-            self.appdir = _board_partition_mount(mountpart)
-            dtbdir = os.path.join(self.appdir, 'boot/dtb')
-            fio.is_rw(self.appdir)
-
-        # Import platform specific data
-        self.compat = dt.read_prop('compatible')
-        self.model = dt.read_prop('model')
-        self.dtb = _board_get_dtb(self.compat, self.model, dtbdir)
-        dtbos = dtc.find_compatible_dtbo_files(self.compat.split(),
-                                               self.bootdir)
-        # Import pinmux
-        self.pinmux = pmx.PinMux()
-
-        # Load header definitions
-        self.board_headers = _board_load_headers(Headers.HDRS, dtbos)
+        self.slot = mountpart
+        self.rootpart = rootpart
+        if rootpart == mountpart:
+            return os.path.join(self.bootdir, 'dtb')
+        self.appdir = _board_partition_mount(mountpart)
+        fio.is_rw(self.appdir)
+        return os.path.join(self.appdir, 'boot/dtb')
 
     def __del__(self):
         if self.appdir:
@@ -254,22 +490,45 @@ class Board(object):
 
     def get_board_headers(self):
         # The returned list has headers in the
-        # same order as listed in Headers.HDRS
+        # same order as listed in Headers.get_names()
         headers = []
-        for hdr_def in Headers.HDRS:
-            if hdr_def.name in self.board_headers.keys():
-                headers.append(hdr_def.name)
+        for name in Headers.get_names(self.compat.split()):
+            if name in self.board_headers.keys():
+                headers.append(name)
         return headers
 
-    def set_active_header(self, hdr):
+    def load_header(self, hdr):
+        # Parses the header on first use. This may be called from a
+        # background thread to parse headers ahead of set_active_header
         if hdr not in self.board_headers.keys():
             raise RuntimeError("Unknown header %s!" % hdr)
-        if self.board_headers[hdr].header is None:
-            self.board_headers[hdr].header = \
-                    header.Header(self.board_headers[hdr].hdtbos,
-                                  self.board_headers[hdr].hdr_def,
-                                  self.board_headers[hdr].preconf_pins,
-                                  self.pinmux)
+        with self.header_lock, lock.shared():
+            if self.board_headers[hdr].header is None:
+                with perf.span('set_active_header %s' % hdr):
+                    self.board_headers[hdr].header = \
+                        header.Header(self.board_headers[hdr].hdtbos,
+                                      self.board_headers[hdr].hdr_def,
+                                      self.board_headers[hdr].preconf_pins,
+                                      self.pinmux, self._get_shared_pins())
+                cache.templates.save()
+        return self.board_headers[hdr].header
+
+    def _get_shared_pins(self):
+        if self.shared_pins is None:
+            with perf.span('shared pins'):
+                self.shared_pins = _board_get_shared_pins(self.board_headers,
+                                                          self.pinmux)
+        return self.shared_pins
+
+    def get_shared_pins(self):
+        # Board-wide index of the SoC pins routed to the headers
+        with self.header_lock, lock.shared():
+            shared = self._get_shared_pins()
+            cache.templates.save()
+        return shared
+
+    def set_active_header(self, hdr):
+        self.load_header(hdr)
         self.hdtbo = self.board_headers[hdr].hdtbos
         self.hw_addons = self.board_headers[hdr].hw_addons
         self.header = self.board_headers[hdr].header
@@ -280,28 +539,41 @@ class Board(object):
             return True
         return False
 
+    def hw_addon_check(self, name):
+        # Result of applying the add-on overlay to the board's DTB, see
+        # overlays.check(), or None if the DTB is not known
+        if name not in self.hw_addons.keys():
+            raise RuntimeError("No overlay found for %s!" % name)
+        if self.dtb is None:
+            return None
+        result = overlays.check(self.dtb, self.hw_addons[name])
+        cache.overlay_checks.save()
+        return result
+
     def hw_addon_get(self):
-        return sorted(self.hw_addons.keys())
+        # Add-ons whose overlay does not apply to the board's DTB are not
+        # offered
+        names = []
+        for name in sorted(self.hw_addons.keys()):
+            result = self.hw_addon_check(name)
+            if result is None or result['ok']:
+                names.append(name)
+        return names
 
     def hw_addon_load(self, name):
         if name not in self.hw_addons.keys():
             raise RuntimeError("No overlay found for %s!" % name)
 
         overlay = self.hw_addons[name]
-        self.header.pins_reset()
-
-        nodes = dtc.find_nodes_with_prop(overlay, '/', 'nvidia,function')
-
-        for node in nodes:
-            pin_node = r'.*/%s-pin([0-9]+).*/' % self.header.prefix
-            res = re.match(pin_node, node)
-            if res is None:
-                raise RuntimeError("Failed to get pin number for node %s!" %
-                                   node)
+        entries = header.get_addon_entries(overlay, self.header.prefix)
+        cache.templates.save()
 
-            pin = int(res.groups()[0])
-            function = dtc.get_prop_value(overlay, node, 'nvidia,function', 0)
-            self.header.pin_set_function(pin, function)
+        # The whole add-on is validated, including against the pins used
+        # by the other headers, before the header's pins are touched
+        with self.header.transaction() as t:
+            t.reset()
+            for pin, _, _, function in entries:
+                t.set_function(pin, function)
 
     def _create_header_dtbo(self, name):
         dtbo = os.path.join(self.bootdir, name)
@@ -363,53 +635,269 @@ class Board(object):
 
         return dtbo
 
-    def create_dtbo_for_header(self):
-        date = datetime.datetime.now().strftime('%Y-%m-%d-%H%M%S')
-        name = "User Custom [%s]" % date
+    def _minimize_header_dtbo(self, dtbo):
+        # Only the pin nodes are needed to express the pin state, so the
+        # rest of the pinmux scaffolding is dropped along with any pinmux
+        # fragment that is left without pins
+        pin_node = r'%s-pin([0-9]+).*' % self.header.prefix
+        for symbol in 'jetson_io_pinmux', 'jetson_io_pinmux_aon':
+            path = dtc.get_prop_value(dtbo, '/__symbols__/', symbol, 0)
+            if path is None:
+                continue
+
+            pins = 0
+            for node in dtc.get_child_nodes(dtbo, path):
+                if re.match(pin_node, node):
+                    pins += 1
+                else:
+                    _board_dtbo_remove_node(dtbo, '/'.join((path, node)))
+
+            if pins == 0:
+                fragment = '/'.join(path.split('/')[:2])
+                _board_dtbo_remove_node(dtbo, fragment)
+
+    def get_dtbo_stats(self, dtbo):
+        return dtc.count_nodes(dtbo), os.path.getsize(dtbo)
+
+    def _check_writable(self):
+        if self.readonly:
+            raise RuntimeError("Board opened read-only!")
+
+    def create_dtbo_for_header(self, minimal=False):
+        self._check_writable()
+        with lock.exclusive(), \
+             perf.span('create_dtbo_for_header %s' % self.hdr):
+            return self._create_dtbo_for_header(minimal)
+
+    def _create_dtbo_for_header(self, minimal):
         fn = "jetson-io-%s-user-custom.dtbo" % self.header.prefix
-        dtbo = self._create_header_dtbo(fn)
-        dtc.set_prop_value(dtbo, '/', 's', 'overlay-name', name)
-        dtc.set_prop_value(dtbo, '/', 's',
-                           'jetson-header-name', self.hdr)
+        dtbo = os.path.join(self.bootdir, fn)
+        temp = self._create_header_dtbo('%s.%d.tmp' % (fn, os.getpid()))
+        try:
+            if minimal:
+                self._minimize_header_dtbo(temp)
+            dtc.set_prop_value(temp, '/', 's',
+                               'jetson-header-name', self.hdr)
+
+            # The generated overlay is identified by a hash of its contents
+            # taken before the timestamp is added, so that an unchanged pin
+            # configuration does not rewrite the existing overlay
+            digest = fio.digest(temp)
+            if os.path.exists(dtbo) and \
+               dtc.get_prop_value(dtbo, '/', 'jetson-io-hash', 0) == digest:
+                return dtbo
+
+            date = datetime.datetime.now().strftime('%Y-%m-%d-%H%M%S')
+            name = "User Custom [%s]" % date
+            dtc.set_prop_value(temp, '/', 's', 'overlay-name', name)
+            dtc.set_prop_value(temp, '/', 's', 'jetson-io-hash', digest)
+            os.rename(temp, dtbo)
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
         return dtbo
 
-    def configure_overlays(self, dtbos):
-        messages = []
-        if len(dtbos) < 1:
-            raise RuntimeError("No overlays to list!")
+    def _create_merged_dtb(self, dtbos, dtb=None):
+        if dtb is None:
+            dtb = self.dtb
+        merged = os.path.join(os.path.dirname(dtb), 'jetson-io-merged.dtb')
+        temp = '%s.%d.tmp' % (merged, os.getpid())
+        reference = '%s.%d.ref' % (merged, os.getpid())
+        try:
+            # Apply the overlays one at a time on top of the base DTB, in
+            # the same way as the bootloader does, and check that fdtoverlay
+            # gives the same tree when applying all of them in a single
+            # pass, so the merged DTB does not depend on how the overlays
+            # are applied, for instance on one overlay using a label that
+            # another one adds
+            shutil.copyfile(dtb, temp)
+            for dtbo in dtbos:
+                dtc.overlay(temp, temp, [dtbo])
+            dtc.overlay(dtb, reference, dtbos)
+            if not dtc.is_equivalent(temp, reference):
+                raise RuntimeError("Merged DTB %s differs when the overlays "
+                                   "are applied in a single pass!" % merged)
+            if not fio.is_identical(temp, merged):
+                os.rename(temp, merged)
+        finally:
+            for f in temp, reference:
+                if os.path.exists(f):
+                    os.remove(f)
+        return merged
+
+    def configure_overlays(self, dtbos, merge=False, both_slots=False):
+        self._check_writable()
+        if self.offline:
+            raise RuntimeError("Cannot configure the DT of an offline board!")
+        with lock.exclusive(), perf.span('configure_overlays'):
+            return self._configure_overlays(dtbos, merge, both_slots)
+
+    def get_entry_name(self, dtbos):
+        # MENU LABEL of the extlinux.conf entry listing the overlays
         name = "Custom Header Config:"
-        overlays = ""
         for dtbo in dtbos:
             hdr = dtc.get_prop_value(dtbo, '/', 'jetson-header-name', 0)
             name += " <%s" % (self.board_headers[hdr].hdr_def.prefix.upper())
             name += " %s>" % dtc.get_prop_value(dtbo, '/', 'overlay-name', 0)
-            if overlays:
-                overlays += ","
-            overlays += dtbo
+        return name
 
+    def _configure_overlays(self, dtbos, merge, both_slots=False):
+        if len(dtbos) < 1:
+            raise RuntimeError("No overlays to list!")
+        name = self.get_entry_name(dtbos)
+        overlays = ','.join(dtbos)
+
+        if not both_slots:
+            prepared = self._prepare_active_slot(dtbos, merge)
+            return self._commit_active_slot(prepared, dtbos, name, overlays,
+                                            merge)
+
+        # The overlays are only generated once. Everything that may fail is
+        # then done on both slots, concurrently, before either
+        # extlinux.conf is rewritten, so a failing slot leaves both slots
+        # booting their previous configuration
+        other = self._get_inactive_slot()
+        slotdir = _board_partition_mount(other)
+        try:
+            graph = tasks.Graph('configure_overlays')
+            graph.add('slot %s' % self.slot,
+                      lambda: self._prepare_active_slot(dtbos, merge))
+            graph.add('slot %s' % other,
+                      lambda: self._prepare_inactive_slot(other, slotdir,
+                                                          dtbos, merge))
+            prepared = graph.run()
+
+            # The inactive slot is committed first, its DTBOs are its own
+            # copies and stay valid if committing the active slot fails
+            results = {}
+            results[other] = self._commit_slot(
+                prepared['slot %s' % other], dtbos, name, overlays, merge)
+            results[self.slot] = self._commit_active_slot(
+                prepared['slot %s' % self.slot], dtbos, name, overlays,
+                merge, True)
+        finally:
+            _board_partition_umount(slotdir)
+
+        messages = []
+        for slot in self.slot, other:
+            messages.append("Rootfs slot %s:" % slot)
+            messages.extend(results[slot])
+        return messages
+
+    def _get_inactive_slot(self):
+        if self.slot not in _rootfs_slots:
+            raise RuntimeError("Active rootfs slot not found!")
+        slot = _rootfs_slots[1 - _rootfs_slots.index(self.slot)]
+        # The root filesystem is then the target of the active slot's
+        # extlinux.conf copy, so the slots cannot be committed separately
+        if slot == self.rootpart:
+            raise RuntimeError("Root filesystem is mounted from the inactive "
+                               "slot %s!" % slot)
+        return slot
+
+    def _prepare_active_slot(self, dtbos, merge):
+        # In merge mode the overlays are folded into a single DTB now, so
+        # the bootloader does not need to apply them on every boot
+        fdt = self.dtb
+        if merge:
+            fdt = self._create_merged_dtb(dtbos)
+        if not self.appdir:
+            return self._prepare_slot('/', fdt, dtbos, merge)
+        return self._prepare_slot(self.appdir, fdt[len(self.appdir):],
+                                  dtbos, merge)
+
+    def _prepare_inactive_slot(self, slot, slotdir, dtbos, merge):
+        fio.is_rw(slotdir)
+        # The slot is expected to hold the same DTB as the active one, but
+        # after an OTA update its contents may differ, so a merged DTB is
+        # built from the slot's own DTB
+        fdt = self.dtb[len(self.appdir):] if self.appdir else self.dtb
+        dtb = os.path.join(slotdir, fdt[1:])
+        if not os.path.exists(dtb):
+            raise RuntimeError("DTB %s not found in rootfs slot %s!" %
+                               (fdt, slot))
+        if merge:
+            fdt = self._create_merged_dtb(dtbos, dtb)[len(slotdir):]
+        return self._prepare_slot(slotdir, fdt, dtbos, merge)
+
+    def _prepare_slot(self, slotdir, fdt, dtbos, merge):
+        # Checks the extlinux.conf of the rootfs slot mounted at slotdir and
+        # copies the DTBOs to its boot tree, fdt is relative to the slot.
+        # Returns what _commit_slot needs to add the extlinux.conf entry.
+        slotextlinux = os.path.join(slotdir, self.extlinux[1:])
+        if not os.path.isfile(slotextlinux):
+            raise RuntimeError("%s not found!" % slotextlinux)
+
+        entries = []
+        for dtbo in dtbos:
+            if merge or slotdir == '/':
+                entries.append(dtbo)
+                continue
+            target = os.path.join(slotdir, dtbo[1:])
+            try:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                copied = fio.copy_if_changed(dtbo, target)
+            except OSError as e:
+                raise RuntimeError("Cannot copy %s to %s: %s!" %
+                                   (dtbo, slotdir, e.strerror))
+            entries.append(dtbo if copied else dtbo + " (unchanged)")
+        return slotdir, fdt, entries
+
+    def _commit_active_slot(self, prepared, dtbos, name, overlays, merge,
+                            verify=False):
+        messages = self._commit_slot(prepared, dtbos, name, overlays, merge,
+                                     verify)
         if self.appdir:
             appextlinux = os.path.join(self.appdir, self.extlinux[1:])
-            sigextlinux = appextlinux + ".sig"
-            extlinux.add_entry(appextlinux, 'JetsonIO', name, self.dtb[len(self.appdir):], overlays, True)
-            messages.append("Modified " + appextlinux + " to add following DTBO entries: ")
+            if fio.copy_if_changed(appextlinux, self.extlinux):
+                messages.append("Copied " + appextlinux + " to " + self.extlinux + ".")
+        return messages
 
-            for dtbo in dtbos:
-                shutil.copyfile(dtbo, os.path.join(self.appdir, dtbo[1:]))
-                messages.append(dtbo)
-            shutil.copyfile(appextlinux, self.extlinux)
-            messages.append("Copied " + appextlinux + " to " + self.extlinux + ".")
+    def _commit_slot(self, prepared, dtbos, name, overlays, merge,
+                     verify=True):
+        # Adds the extlinux.conf entry to a slot prepared by _prepare_slot
+        slotdir, fdt, entries = prepared
+        if merge:
+            overlays = None
+            header = "merged DTB %s with following DTBO entries: " % \
+                     os.path.join(slotdir, fdt[1:])
         else:
-            sigextlinux = self.extlinux + ".sig"
-            extlinux.add_entry(self.extlinux, 'JetsonIO', name, self.dtb, overlays, True)
-            messages.append("Modified " + self.extlinux + " to add following DTBO entries: ")
-            for dtbo in dtbos:
-                messages.append(dtbo)
+            header = "following DTBO entries: "
+
+        messages = []
+        slotextlinux = os.path.join(slotdir, self.extlinux[1:])
+        sigextlinux = slotextlinux + ".sig"
+        modified = extlinux.add_entry(slotextlinux, 'JetsonIO', name, fdt, overlays, True)
+        if modified:
+            messages.append("Modified " + slotextlinux + " to add " + header)
+        else:
+            messages.append(slotextlinux + " already contains " + header)
+        messages.extend(entries)
 
-        if os.path.exists(sigextlinux):
+        if modified and os.path.exists(sigextlinux):
             backup_filename = sigextlinux + ".jetson-io-backup"
             os.rename(sigextlinux, backup_filename)
             messages.append("File " + sigextlinux + " has been backed up as " + backup_filename + ".")
+        if verify:
+            self._verify_slot(slotdir, fdt, dtbos, name, overlays, merge)
         return messages
 
-    def configure_dt_for_next_boot(self, dtbos):
-        return self.configure_overlays(dtbos)
+    def _verify_slot(self, slotdir, fdt, dtbos, name, overlays, merge):
+        # Reads back what the bootloader will use from the slot
+        slotextlinux = os.path.join(slotdir, self.extlinux[1:])
+        entry = extlinux.get_entry(slotextlinux, 'JetsonIO')
+        if entry is None or entry.get('MENU') != 'LABEL %s' % name or \
+           entry.get('FDT') != fdt or entry.get('OVERLAYS') != overlays:
+            raise RuntimeError("JetsonIO entry in %s does not match the "
+                               "configuration!" % slotextlinux)
+        if not os.path.exists(os.path.join(slotdir, fdt[1:])):
+            raise RuntimeError("DTB %s not found in %s!" % (fdt, slotdir))
+        if merge or slotdir == '/':
+            return
+        for dtbo in dtbos:
+            if not fio.is_identical(dtbo, os.path.join(slotdir, dtbo[1:])):
+                raise RuntimeError("DTBO %s in %s does not match the "
+                                   "generated one!" % (dtbo, slotdir))
+
+    def configure_dt_for_next_boot(self, dtbos, merge=False, both_slots=False):
+        return self.configure_overlays(dtbos, merge, both_slots)
@@ -0,0 +1,235 @@
+# SPDX-FileCopyrightText: Copyright (c) 2019-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Index of the camera sensors that the overlays in the boot directory add
+# or enable, with the CSI port, lane count, I2C bus and address and the
+# GPIOs each one uses, so that an overlay can be picked by querying for a
+# sensor rather than by its overlay-name. The index is persisted next to
+# the overlay index.
+
+from Utils import cache
+from Utils import fdt
+import fnmatch
+import re
+import struct
+
+
+def _get_value(node, prop):
+    value = node.props.get(prop)
+    if value is None:
+        return None
+    return fdt.format_value(value)
+
+
+def _get_int(node, prop):
+    value = _get_value(node, prop)
+    if value is None:
+        return None
+    try:
+        return int(value.split()[0], 0)
+    except ValueError:
+        return None
+
+
+def _get_fixups(overlay):
+    # {(path, prop, offset): label} of the references to the base tree
+    return dict(((path, prop, offset), label) for label, path, prop, offset
+                in fdt.get_fixups(overlay))
+
+
+def _get_targets(overlay, fixups):
+    # Base paths (or &label for phandle targets) of the fragments
+    targets = {}
+    for name, fragment in overlay.root.children.items():
+        if 'target-path' in fragment.props:
+            targets[name] = fdt.get_strings(fragment.props['target-path'])[0]
+        elif ('/' + name, 'target', 0) in fixups:
+            targets[name] = '&' + fixups[('/' + name, 'target', 0)]
+    return targets
+
+
+def _get_gpios(node, path, fixups):
+    # GPIOs as '<controller label>:<line>', assuming two cells per GPIO
+    gpios = []
+    for prop, value in node.props.items():
+        if not prop.endswith('gpios') or len(value) % 12:
+            continue
+        for offset in range(0, len(value), 12):
+            line = struct.unpack_from('>I', value, offset + 4)[0]
+            label = fixups.get((path, prop, offset), 'gpio')
+            gpios.append('%s:%d' % (label, line))
+    return gpios
+
+
+# Devices next to the sensors on a camera module, such as I2C muxes, GPIO
+# expanders, SerDes, IMUs and EEPROMs, that an overlay enables the same way
+_non_sensor = re.compile(r'(tca|pca|max|bmi|ina|at24|eeprom)[0-9]')
+
+
+def _get_modes(node):
+    return [c for n, c in sorted(node.children.items())
+            if n.startswith('mode') and 'tegra_sinterface' in c.props]
+
+
+def _get_bus(base_path):
+    # Base path of the I2C bus (or mux channel) that the node is on, if any
+    nodes = base_path.rstrip('/').split('/')
+    for i in range(len(nodes) - 2, 0, -1):
+        if re.match(r'i2c(@|$)', nodes[i]):
+            return '/'.join(nodes[:i + 1])
+    return None
+
+
+def _get_address(node, name):
+    # Overlays that amend a sensor of the base DTB often do not repeat its
+    # reg, so fall back on the unit-address of the node name
+    addr = _get_int(node, 'reg')
+    if addr is None and '@' in name:
+        try:
+            addr = int(name.split('@', 1)[1], 16)
+        except ValueError:
+            return None
+    return addr
+
+
+def _is_sensor(node, name, target):
+    # Sensors have modes with a CSI interface or, when the overlay only
+    # amends a sensor of the base DTB, a port of the media graph. A fragment
+    # targeting the sensor itself may only enable it, in which case anything
+    # on the bus but the other devices of the camera module is a sensor.
+    if _get_modes(node) or 'ports' in node.children:
+        return True
+    return target and _get_value(node, 'status') == 'okay' and \
+        not _non_sensor.match(name)
+
+
+def get_sensors(dtbo):
+    # Walks the overlay once and returns its sensors as a list of dicts
+    overlay = fdt.load(dtbo)
+    fixups = _get_fixups(overlay)
+    targets = _get_targets(overlay, fixups)
+    sensors = []
+    found = {}
+
+    # Only camera overlays enable sensors by target alone
+    camera = False
+    for name, fragment in overlay.root.children.items():
+        node = fragment.children.get('__overlay__')
+        paths = [targets.get(name, '')] + list(node.children if node else [])
+        if any('tegra-camera-platform' in p for p in paths):
+            camera = True
+
+    def walk(node, path, base_path, parents, target=False):
+        if _get_value(node, 'status') == 'disabled':
+            return
+        name = base_path.rstrip('/').split('/')[-1]
+        bus = _get_bus(base_path)
+        addr = _get_address(node, name)
+        if bus and addr is not None and \
+           _is_sensor(node, name, target and camera):
+            modes = _get_modes(node)
+            gpios = []
+            for p, n in parents + [(path, node)]:
+                gpios += _get_gpios(n, p, fixups)
+            sensor = {
+                'sensor': name,
+                'compatible': _get_value(node, 'compatible'),
+                'devnode': _get_value(node, 'devnode'),
+                'i2c_bus': bus,
+                'i2c_addr': addr,
+                'csi_port': _get_value(modes[0], 'tegra_sinterface')
+                            if modes else None,
+                'lanes': max([_get_int(m, 'num_lanes') or 0 for m in modes]
+                             or [0]) or None,
+                'phy_mode': _get_value(modes[0], 'phy_mode')
+                            if modes else None,
+                'gpios': gpios,
+            }
+            # Several fragments may amend the same sensor
+            key = base_path.rstrip('/')
+            if key in found:
+                other = found[key]
+                for field, value in sensor.items():
+                    if field == 'gpios':
+                        other[field] += [g for g in value
+                                         if g not in other[field]]
+                    elif other[field] is None:
+                        other[field] = value
+                return
+            found[key] = sensor
+            sensors.append(sensor)
+            return
+        for child_name, child in node.children.items():
+            walk(child, '%s/%s' % (path, child_name),
+                 '%s/%s' % (base_path.rstrip('/'), child_name),
+                 parents + [(path, node)])
+
+    for name, fragment in overlay.root.children.items():
+        node = fragment.children.get('__overlay__')
+        if node is None or name not in targets:
+            continue
+        walk(node, '/%s/__overlay__' % name, targets[name], [], True)
+    return sensors
+
+
+def get_index(dtbos):
+    # Returns {dtbo: {'overlay-name', 'compatible', 'sensors'}}
+    def read(dtbos):
+        entries = []
+        for dtbo in dtbos:
+            root = fdt.load(dtbo).root
+            entries.append({
+                'overlay-name': _get_value(root, 'overlay-name'),
+                'compatible': _get_value(root, 'compatible'),
+                'sensors': get_sensors(dtbo),
+            })
+        return entries
+    return dict(zip(dtbos, cache.cameras.get_many(dtbos, read)))
+
+
+def _matches(sensor, filters):
+    for key, value in filters.items():
+        if value is None:
+            continue
+        if key == 'sensor':
+            names = [sensor['sensor'], sensor['compatible'] or '']
+            if not any(fnmatch.fnmatch(n, '*%s*' % value) for n in names):
+                return False
+        elif sensor.get(key) != value:
+            return False
+    return True
+
+
+def query(index, platform=None, count=None, **filters):
+    # Returns [(dtbo, sensor)] of the sensors matching all the filters
+    # (sensor, i2c_bus, i2c_addr, csi_port, lanes, ...), limited to the
+    # overlays for the platform and with count sensors, if given
+    rows = []
+    for dtbo, entry in sorted(index.items()):
+        if platform is not None and \
+           platform not in (entry['compatible'] or '').split():
+            continue
+        if count is not None and len(entry['sensors']) != count:
+            continue
+        for sensor in entry['sensors']:
+            if _matches(sensor, filters):
+                rows.append((dtbo, sensor))
+    return rows
@@ -0,0 +1,274 @@
+# SPDX-FileCopyrightText: Copyright (c) 2019-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Offline generation of the jetson-io configuration of many boards. A
+# snapshot of a board (see capture()) holds its device tree, the debugfs
+# pinmux state, the overlays and DTB of its boot directory and its
+# extlinux.conf, in the layout below. Boards are then configured from
+# their snapshots, one per worker process, as the paths read by the tool
+# are module globals. Each board gets its DTBOs and an extlinux.conf with
+# the JetsonIO entry, referring to the paths on the board.
+
+from Jetson import board
+from Linux import debugfs
+from Linux import dt
+from Linux import extlinux
+from Utils import cache
+from Utils import lock
+import concurrent.futures
+import datetime
+import fnmatch
+import glob
+import json
+import os
+import shutil
+import time
+
+
+SNAPSHOT = 'snapshot.json'
+
+# Paths of a snapshot
+_devicetree = 'devicetree'
+_debugfs = 'debugfs'
+_bootdir = 'dts'
+_extlinux = 'extlinux.conf'
+
+
+def capture(outdir, name, bootdir='/boot/arducam/dts',
+            extlinux_conf='/boot/extlinux/extlinux.conf'):
+    # Captures the running board into outdir
+    jetson = board.Board(bootdir, extlinux_conf, readonly=True)
+    if jetson.dtb is None:
+        raise RuntimeError("DTB of %s not found!" % jetson.model)
+    if os.path.exists(outdir):
+        raise RuntimeError("Snapshot %s already exists!" % outdir)
+
+    shutil.copytree(dt._dt_base_path, os.path.join(outdir, _devicetree),
+                    symlinks=True)
+    for dev in glob.glob(os.path.join(debugfs.mountpoint, 'pinctrl',
+                                      '*.pinmux')):
+        path = os.path.join(outdir, _debugfs, 'pinctrl',
+                            os.path.basename(dev))
+        os.makedirs(path)
+        for fn in ['pinconf-groups', 'pinmux-functions']:
+            if os.path.exists(os.path.join(dev, fn)):
+                shutil.copyfile(os.path.join(dev, fn),
+                                os.path.join(path, fn))
+
+    os.makedirs(os.path.join(outdir, _bootdir, 'dtb'))
+    for dtbo in glob.glob(os.path.join(bootdir, '*.dtbo')):
+        shutil.copy2(dtbo, os.path.join(outdir, _bootdir))
+    shutil.copy2(jetson.dtb, os.path.join(outdir, _bootdir, 'dtb'))
+    shutil.copy2(extlinux_conf, os.path.join(outdir, _extlinux))
+
+    info = {'name': name,
+            'captured': datetime.datetime.now().isoformat(),
+            'compatible': jetson.compat,
+            'model': jetson.model,
+            'bootdir': bootdir,
+            'extlinux': extlinux_conf,
+            'dtb': jetson.dtb}
+    with open(os.path.join(outdir, SNAPSHOT), 'w') as f:
+        json.dump(info, f, indent=2)
+    return info
+
+
+def load_profiles(path):
+    # {"profiles": {profile: {header: [functions] | {"addon": name}}},
+    #  "devices": {device name pattern: profile}}
+    with open(path, 'r') as f:
+        data = json.load(f)
+    for key in ['profiles', 'devices']:
+        if key not in data:
+            raise RuntimeError("No '%s' in %s!" % (key, path))
+    for pattern, profile in data['devices'].items():
+        if profile not in data['profiles']:
+            raise RuntimeError("Unknown profile %s for %s in %s!" %
+                               (profile, pattern, path))
+    return data
+
+
+def get_profile(profiles, name):
+    # Profile of the first device pattern matching the name
+    for pattern, profile in profiles['devices'].items():
+        if fnmatch.fnmatchcase(name, pattern):
+            return profile
+    return None
+
+
+def find_snapshots(path):
+    return sorted(os.path.dirname(p) for p in
+                  glob.glob(os.path.join(path, '*', SNAPSHOT)))
+
+
+def _link(src, dst):
+    # The generated files are written next to the snapshot's overlays
+    # under new names, so the overlays themselves can be shared
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def open_snapshot(snapshot, lockdir, cachedir=None, bootdir=None,
+                  extlinux_conf=None, readonly=False):
+    # Points the tool at a snapshot and returns the offline Board of it;
+    # only one snapshot can be open in a process at a time
+    dt._dt_base_path = os.path.join(snapshot, _devicetree)
+    debugfs.mountpoint = os.path.join(snapshot, _debugfs)
+    lock.lock_dir = lockdir
+    if cachedir:
+        cache.cache_dir = cachedir
+    return board.Board(bootdir or os.path.join(snapshot, _bootdir),
+                       extlinux_conf or os.path.join(snapshot, _extlinux),
+                       readonly, offline=True)
+
+
+def get_name(snapshot):
+    with open(os.path.join(snapshot, SNAPSHOT), 'r') as f:
+        return json.load(f)['name']
+
+
+def _configure(jetson, spec, minimal):
+    # Returns the DTBOs for the headers of the profile and those keeping
+    # the pins configured by an earlier session
+    dtbos = []
+    for hdr in jetson.get_board_headers():
+        config = spec.get(hdr)
+        if isinstance(config, dict):
+            jetson.set_active_header(hdr)
+            if config['addon'] not in jetson.hw_addon_get():
+                raise NameError("No configuration found for %s on %s!" %
+                                (config['addon'], hdr))
+            jetson.hw_addon_load(config['addon'])
+            dtbos.append(jetson.hw_addons[config['addon']])
+        elif config:
+            jetson.set_active_header(hdr)
+            with jetson.header.transaction() as t:
+                for function in config:
+                    t.enable(function)
+            if not jetson.header.pins_are_default():
+                dtbos.append(jetson.create_dtbo_for_header(minimal))
+        elif jetson.preconf_pins_avail(hdr):
+            jetson.set_active_header(hdr)
+            dtbos.append(jetson.create_dtbo_for_header(minimal))
+    for hdr in spec:
+        if hdr not in jetson.board_headers:
+            raise NameError("Header %s not found!" % hdr)
+    return dtbos
+
+
+def generate_device(snapshot, profile, spec, outdir, minimal=False,
+                    cachedir=None):
+    # Generates the configuration of one snapshot into outdir, returns
+    # {'device', 'profile', 'ok', 'error', 'dtbos', 'times'}
+    start = time.perf_counter()
+    with open(os.path.join(snapshot, SNAPSHOT), 'r') as f:
+        info = json.load(f)
+    result = {'device': info['name'], 'profile': profile, 'ok': False,
+              'error': None, 'dtbos': [], 'times': {}}
+
+    def phase(name, since):
+        now = time.perf_counter()
+        result['times'][name] = round((now - since) * 1000, 3)
+        return now
+
+    workdir = os.path.join(outdir, info['name'])
+    if os.path.exists(workdir):
+        shutil.rmtree(workdir)
+    bootdir = os.path.join(workdir, _bootdir)
+    shutil.copytree(os.path.join(snapshot, _bootdir), bootdir,
+                    copy_function=_link)
+    out_extlinux = os.path.join(workdir, _extlinux)
+    shutil.copyfile(os.path.join(snapshot, _extlinux), out_extlinux)
+
+    since = phase('setup', start)
+    try:
+        jetson = open_snapshot(snapshot, workdir, cachedir, bootdir,
+                               out_extlinux)
+        since = phase('board', since)
+        dtbos = _configure(jetson, spec, minimal)
+        since = phase('headers', since)
+
+        # The entry refers to the files as they are installed on the board
+        device = [os.path.join(info['bootdir'], os.path.basename(dtbo))
+                  for dtbo in dtbos]
+        if dtbos:
+            extlinux.add_entry(out_extlinux, 'JetsonIO',
+                               jetson.get_entry_name(dtbos), info['dtb'],
+                               ','.join(device), True)
+        backup = out_extlinux + '.jetson-io-backup'
+        if os.path.exists(backup):
+            os.remove(backup)
+        since = phase('extlinux', since)
+
+        # Only the generated files are kept
+        for fn in os.listdir(bootdir):
+            path = os.path.join(bootdir, fn)
+            if path not in dtbos or not fn.startswith('jetson-io-'):
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+        for fn in os.listdir(workdir):
+            if fn.endswith('.lock'):
+                os.remove(os.path.join(workdir, fn))
+        result['dtbos'] = device
+        result['ok'] = True
+    except Exception as e:
+        # A broken snapshot or profile only fails its own device
+        result['error'] = str(e)
+        shutil.rmtree(workdir, ignore_errors=True)
+    cache.overlays.save()
+    cache.templates.save()
+    result['times']['total'] = round((time.perf_counter() - start) * 1000, 3)
+    return result
+
+
+def _generate(args):
+    return generate_device(*args)
+
+
+def generate(snapshots, profiles, outdir, jobs=None, minimal=False):
+    # Generates the configuration of every snapshot with a profile on a
+    # pool of worker processes; returns the results in snapshot order
+    tasks = []
+    results = []
+    cachedir = os.path.join(outdir, '.cache')
+    for snapshot in snapshots:
+        name = get_name(snapshot)
+        profile = get_profile(profiles, name)
+        if profile is None:
+            results.append({'device': name, 'profile': None, 'ok': False,
+                            'error': "No profile for %s!" % name,
+                            'dtbos': [], 'times': {}})
+            continue
+        results.append(None)
+        tasks.append((snapshot, profile, profiles['profiles'][profile],
+                      outdir, minimal, cachedir))
+
+    os.makedirs(outdir, exist_ok=True)
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        generated = executor.map(_generate, tasks)
+        for index, result in enumerate(results):
+            if result is None:
+                results[index] = next(generated)
+    return results
@@ -21,11 +21,13 @@
 
 import os
 import re
+import tempfile
 from Jetson import io
+from Utils import cache
 from Utils import dtc
 
 
-def _parse_pinmux_pins(dts, path, prefix, pinmux, pins, pingroups):
+def _parse_pinmux_pins(dts, path, prefix, entries):
     path_nodes = path.split('/')
     path_nodes[0] = '/'
 
@@ -86,26 +88,52 @@ def _parse_pinmux_pins(dts, path, prefix, pinmux, pins, pingroups):
             elif prop == 'nvidia,pin-label':
                 label = value
 
-        if name is None:
-            continue
+        entries.append([path, node, pin_num, name, function, group, label])
 
-        node = os.path.join(path, node, '')
-        if function is None:
-        # Fixed function or always on pins
-            pins.add_fixed(pinmux, name, pin_num, node, label)
-        else:
-        # Configurable pins, associated with pin groups
-            if group is None:
-                group = function
-            pins.add_configurable(pinmux, name, pin_num, node,
-                                  function, label)
-            pingroups.add(group, function, name)
 
+def _parse_pinmux_nodes(dtbo, path, prefix, entries):
+    # Same as _parse_pinmux_pins(), but reads the pin nodes directly from
+    # the DTBO rather than from its decompiled source
+    for node in dtc.get_child_nodes(dtbo, path):
+        res = re.match(r'%s-pin([0-9]+).*' % prefix, node)
+        if res is None:
+            continue
 
-def _header_parse_pinmap(dtbo, prefix, pinmux, pins, pingroups):
-    if dtbo is None:
+        pin_num = int(res.groups()[0])
+        values = {}
+        for prop in ['nvidia,pins', 'nvidia,function', 'nvidia,pin-group',
+                     'nvidia,pin-label']:
+            value = dtc.get_prop_value(dtbo, os.path.join(path, node), prop, 0)
+            # Only single string values without whitespace, as matched by
+            # _parse_pinmux_pins()
+            if value and not re.search(r'\s', value):
+                values[prop] = value
+
+        entries.append([path, node, pin_num, values.get('nvidia,pins'),
+                        values.get('nvidia,function'),
+                        values.get('nvidia,pin-group'),
+                        values.get('nvidia,pin-label')])
+
+
+def _add_pin(path, node, pin_num, name, function, group, label,
+             pinmux, pins, pingroups):
+    if name is None:
         return
 
+    node = os.path.join(path, node, '')
+    if function is None:
+    # Fixed function or always on pins
+        pins.add_fixed(pinmux, name, pin_num, node, label)
+    else:
+    # Configurable pins, associated with pin groups
+        if group is None:
+            group = function
+        pins.add_configurable(pinmux, name, pin_num, node,
+                              function, label)
+        pingroups.add(group, function, name)
+
+
+def _get_pin_entries(dtbo, prefix):
     pinmux_node_path = dtc.get_prop_value(dtbo, '/__symbols__/',
                                           'jetson_io_pinmux', 0)
     pinmux_aon_node_path = dtc.get_prop_value(dtbo, '/__symbols__/',
@@ -114,22 +142,156 @@ def _header_parse_pinmap(dtbo, prefix, pinmux, pins, pingroups):
         raise RuntimeError(
             "Node 'jetson_io_pinmux' and jetson_io_pinmux_aon not found in %s!" % dtbo)
 
-    temp_file = 'jetson-io-overlay.dts'
-    dtc.extract(dtbo, temp_file)
+    entries = []
+    if dtc.in_process():
+        for path in [pinmux_node_path, pinmux_aon_node_path]:
+            if path:
+                _parse_pinmux_nodes(dtbo, path, prefix, entries)
+        return entries
+
+    fd, temp_file = tempfile.mkstemp(prefix='jetson-io-overlay-',
+                                     suffix='.dts')
+    os.close(fd)
     try:
+        dtc.extract(dtbo, temp_file)
         with open(temp_file, 'r') as f:
             if pinmux_node_path:
-                _parse_pinmux_pins(f, pinmux_node_path,
-                               prefix, pinmux, pins, pingroups)
+                _parse_pinmux_pins(f, pinmux_node_path, prefix, entries)
 
             if pinmux_aon_node_path:
                 f.seek(0)
-                _parse_pinmux_pins(f, pinmux_aon_node_path,
-                               prefix, pinmux, pins, pingroups)
+                _parse_pinmux_pins(f, pinmux_aon_node_path, prefix, entries)
     except:
         raise
     finally:
         os.remove(temp_file)
+    return entries
+
+
+def get_pin_entries(dtbo, prefix):
+    # The pin nodes of a header overlay as [path, node, pin number, pin
+    # name, function, group, label], which only depend on the overlay, so
+    # they are kept in the persistent cache
+    return cache.templates.get(dtbo, lambda dtbo:
+                               _get_pin_entries(dtbo, prefix), prefix)
+
+
+def _get_addon_entries(dtbo, prefix):
+    entries = []
+    pin_node = r'.*/%s-pin([0-9]+).*/' % prefix
+    for node in dtc.find_nodes_with_prop(dtbo, '/', 'nvidia,function'):
+        res = re.match(pin_node, node)
+        if res is None:
+            raise RuntimeError("Failed to get pin number for node %s!" %
+                               node)
+        entries.append([int(res.groups()[0]), node,
+                        dtc.get_prop_value(dtbo, node, 'nvidia,pins', 0),
+                        dtc.get_prop_value(dtbo, node, 'nvidia,function', 0)])
+    return entries
+
+
+def get_addon_entries(dtbo, prefix):
+    # The pin nodes of a hardware add-on overlay as [pin number, node, pin
+    # name, function], kept in the persistent cache like get_pin_entries()
+    return cache.templates.get(dtbo, lambda dtbo:
+                               _get_addon_entries(dtbo, prefix),
+                               'addon:%s' % prefix)
+
+
+class SharedPins(object):
+    # Board-wide index from the SoC pin names ('nvidia,pins') to the header
+    # pins and add-on overlays routing them. Headers are parsed separately,
+    # so it also records the function each header configures a SoC pin for
+    # (owners); selecting another function for a SoC pin owned by another
+    # header is a conflict. Lookups are per pin, so checks cost O(1).
+    def __init__(self):
+        self.pins = {}
+        self.addons = {}
+        self.owners = {}
+        self.preconf = {}
+
+    def add_pin(self, hdr, pin_num, name):
+        refs = self.pins.setdefault(name, [])
+        if (hdr, pin_num) not in refs:
+            refs.append((hdr, pin_num))
+
+    def add_addon(self, hdr, addon, name):
+        refs = self.addons.setdefault(name, [])
+        if (hdr, addon) not in refs:
+            refs.append((hdr, addon))
+
+    def set_preconf(self, hdr, functions):
+        # Functions of the pins configured by an earlier session, which
+        # the header keeps unless they are changed
+        self.preconf[hdr] = dict(functions)
+        self.reset(hdr)
+
+    def get_pins(self, name):
+        return self.pins.get(name, [])
+
+    def get_addons(self, name):
+        return self.addons.get(name, [])
+
+    def get_shared(self):
+        # SoC pins routed to more than one header
+        return sorted(name for name, refs in self.pins.items()
+                      if len(set(hdr for hdr, _ in refs)) > 1)
+
+    def get_conflicts(self, hdr, functions):
+        # functions: {pin name: function}; returns [(pin name, function,
+        # other header, function used by the other header)]
+        conflicts = []
+        for name, function in functions.items():
+            for other, used in self.owners.get(name, {}).items():
+                if other != hdr and used != function:
+                    conflicts.append((name, function, other, used))
+        return conflicts
+
+    def check(self, hdr, functions):
+        conflicts = self.get_conflicts(hdr, functions)
+        if not conflicts:
+            return
+        messages = []
+        for name, function, other, used in conflicts:
+            pins = [str(p) for h, p in self.get_pins(name) if h == other]
+            owner = other
+            if pins:
+                owner += " pin %s" % ','.join(pins)
+            messages.append("%s for %s is used as %s by %s" %
+                            (name, function, used, owner))
+        raise RuntimeError("Conflicting pin selection on %s: %s!" %
+                           (hdr, '; '.join(messages)))
+
+    def claim(self, hdr, functions):
+        for name, function in functions.items():
+            self.owners.setdefault(name, {})[hdr] = function
+
+    def release(self, hdr, names=None):
+        if names is None:
+            names = list(self.owners.keys())
+        for name in names:
+            owners = self.owners.get(name)
+            if owners is None:
+                continue
+            owners.pop(hdr, None)
+            if not owners:
+                del self.owners[name]
+
+    def reset(self, hdr):
+        self.release(hdr)
+        self.claim(hdr, self.preconf.get(hdr, {}))
+
+    def get_claims(self, hdr):
+        return dict((name, owners[hdr]) for name, owners
+                    in self.owners.items() if hdr in owners)
+
+
+def _header_parse_pinmap(dtbo, prefix, pinmux, pins, pingroups):
+    if dtbo is None:
+        return
+
+    for entry in get_pin_entries(dtbo, prefix):
+        _add_pin(*(entry + [pinmux, pins, pingroups]))
 
 
 class _HeaderPins(object):
@@ -293,19 +455,143 @@ class _HeaderPins(object):
             raise NameError("Unknown pin %s!" % name)
         return self.pins[name].set_function(function)
 
+    def get_state(self):
+        # Function and state of every configurable pin, in the order of
+        # self.pins, which does not change once the header is parsed
+        return tuple(pin.get_state() for pin in self.pins.values())
+
+    def set_state(self, state):
+        for pin, pin_state in zip(self.pins.values(), state):
+            pin.set_state(pin_state)
+
+
+class Transaction(object):
+    # Batch of pin group enables and disables and pin function sets on a
+    # header. The whole batch is validated against the pin groups, the
+    # functions of the pins and the pins used by the other headers before
+    # any pin is changed, and it is applied atomically: if applying fails,
+    # the header is restored from a snapshot taken before. Used as a
+    # context manager, the batch is committed on exit.
+    def __init__(self, header):
+        self.header = header
+        self.ops = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        return False
+
+    def enable(self, group):
+        self.ops.append(('enable', group))
+
+    def disable(self, group):
+        self.ops.append(('disable', group))
+
+    def set_function(self, pin, function):
+        self.ops.append(('set', pin, function))
+
+    def reset(self):
+        self.ops.append(('reset',))
+
+    def _request(self, functions, owners, names, function, owner):
+        # Two ops of the batch must not ask for different functions on the
+        # same pin, or whichever comes last would silently win
+        for name in names:
+            if functions.get(name, function) != function:
+                raise RuntimeError("Conflicting pin selection on %s: %s is "
+                                   "used as %s by %s and as %s by %s!" %
+                                   (self.header.name, name, functions[name],
+                                    owners[name], function, owner))
+            functions[name] = function
+            owners[name] = owner
+
+    def validate(self):
+        header = self.header
+        functions = {}
+        owners = {}
+        for op in self.ops:
+            if op[0] in ('enable', 'disable'):
+                names = header.pingroups.get_pins(op[1])
+                if op[0] == 'enable':
+                    function = header.pingroups.get_function(op[1])
+                    self._request(functions, owners, names, function, op[1])
+                else:
+                    for name in names:
+                        functions.pop(name, None)
+            elif op[0] == 'set':
+                name = header.pins.get_name(op[1])
+                if name is None:
+                    raise NameError("Cannot configure pin%d!" % op[1])
+                if op[2] not in header.pins.get_functions(name):
+                    raise NameError("Invalid function %s for pin%d %s!" %
+                                    (op[2], op[1], name))
+                self._request(functions, owners, [name], op[2],
+                              'pin%d' % op[1])
+            else:
+                functions = {}
+        header.shared.check(header.name, functions)
+
+    def commit(self):
+        self.validate()
+        header = self.header
+        snapshot = header.snapshot()
+        try:
+            for op in self.ops:
+                if op[0] == 'enable':
+                    header.pingroup_enable(op[1])
+                elif op[0] == 'disable':
+                    header.pingroup_disable(op[1])
+                elif op[0] == 'set':
+                    header.pin_set_function(op[1], op[2])
+                else:
+                    header.pins_reset()
+        except:
+            header.restore(snapshot)
+            raise
+        self.ops = []
+
 
 class Header(object):
-    def __init__(self, dtbo, header, preconf_pins, pinmux):
+    def __init__(self, dtbo, header, preconf_pins, pinmux, shared=None):
+        self.name = header.name
         self.prefix = header.prefix
         self.preconf_pins = preconf_pins
+        # Pins shared with the other headers of the board
+        self.shared = shared if shared is not None else SharedPins()
         self.pins = _HeaderPins(header)
         self.pingroups = io.PinGroups()
         _header_parse_pinmap(dtbo, self.prefix, pinmux,
                              self.pins, self.pingroups)
+        # Labels by pin number, dropped when the pin's function changes
+        self.label_cache = {}
+
+    def _labels_invalidate(self, names=None):
+        if names is None:
+            self.label_cache = {}
+            return
+        for pin in self.pins.get_pin_indices(names):
+            self.label_cache.pop(pin, None)
 
     def pin_count(self):
         return self.pins.get_count()
 
+    def snapshot(self):
+        # Compact copy of the pin configuration, see restore()
+        return self.pins.get_state(), self.shared.get_claims(self.name)
+
+    def restore(self, snapshot):
+        state, claims = snapshot
+        self._labels_invalidate()
+        self.pins.set_state(state)
+        self.shared.release(self.name)
+        self.shared.claim(self.name, claims)
+
+    def transaction(self):
+        return Transaction(self)
+
     def pin_get_function(self, name):
         return self.pins.get_function(name)
 
@@ -313,7 +599,19 @@ class Header(object):
         name = self.pins.get_name(pin)
         if name is None:
             raise NameError("Cannot configure pin%d!" % pin)
-        return self.pins.set_function(name, function)
+        self.shared.check(self.name, {name: function})
+        self._labels_invalidate([name])
+        result = self.pins.set_function(name, function)
+        self._shared_update([name])
+        return result
+
+    def _shared_update(self, names):
+        # Enabled pins are owned by the header, disabled ones released
+        enabled = [name for name in names if self.pins.is_enabled(name)]
+        self.shared.release(self.name,
+                            [name for name in names if name not in enabled])
+        self.shared.claim(self.name, dict(
+            (name, self.pins.get_function(name)) for name in enabled))
 
     def pin_get_node(self, name, function=None):
         return self.pins.get_node(name, function)
@@ -325,6 +623,11 @@ class Header(object):
         return self.pins.get_default_node(name)
 
     def pin_get_label(self, pin):
+        if pin not in self.label_cache:
+            self.label_cache[pin] = self._pin_get_label(pin)
+        return self.label_cache[pin]
+
+    def _pin_get_label(self, pin):
         name = self.pins.get_name(pin)
         if name is None:
             return 'NA'
@@ -355,10 +658,14 @@ class Header(object):
         return self.pins.are_default()
 
     def pins_set_default(self):
+        self._labels_invalidate()
         self.pins.set_default_all()
+        self.shared.reset(self.name)
 
     def pins_reset(self):
+        self._labels_invalidate()
         self.pins.disable_all()
+        self.shared.release(self.name)
 
     def pingroups_available(self):
         return sorted(self.pingroups.get_available())
@@ -366,6 +673,7 @@ class Header(object):
     def pingroup_enable(self, group):
         pins = self.pingroups.get_pins(group)
         function = self.pingroups.get_function(group)
+        self.shared.check(self.name, dict.fromkeys(pins, function))
         for pin in pins:
             current = self.pins.get_function(pin)
             if current == function:
@@ -374,13 +682,17 @@ class Header(object):
                 group = self.pingroups.get_group(pin, current)
                 if group is not None:
                     self.pingroup_disable(current)
+        self._labels_invalidate(pins)
         for pin in pins:
             self.pins.set_function(pin, function)
+        self._shared_update(pins)
 
     def pingroup_disable(self, group):
         pins = self.pingroups.get_pins(group)
+        self._labels_invalidate(pins)
         for pin in pins:
             self.pins.disable(pin)
+        self._shared_update(pins)
 
     def pingroup_is_enabled(self, group):
         pins = self.pingroups.get_pins(group)
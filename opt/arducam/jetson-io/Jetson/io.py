@@ -173,6 +173,12 @@ class Pin(object):
     def get_functions(self):
         return self.function.get_available()
 
+    def get_state(self):
+        return self.function.current, self.state.current
+
+    def set_state(self, state):
+        self.function.current, self.state.current = state
+
     def set_function(self, function):
         self.function.set(function)
         if self.function.is_reserved():
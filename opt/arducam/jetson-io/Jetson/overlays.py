@@ -0,0 +1,103 @@
+# SPDX-FileCopyrightText: Copyright (c) 2019-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Checks whether overlays apply to base DTBs, by applying them in memory.
+# An overlay is broken for a DTB if it refers to labels the DTB does not
+# define (unresolved fixups), if one of its fragments has no target in the
+# DTB or if applying it fails otherwise. Base properties the overlay
+# changes are reported as conflicts. Results are cached by the hashes of
+# both files.
+
+from Utils import cache
+from Utils import fdt
+from Utils import fio
+import concurrent.futures
+import copy
+
+
+def _check(dtb, dtbo):
+    report = {'unresolved': [], 'missing': [], 'conflicts': []}
+    try:
+        base = copy.deepcopy(fdt.load(dtb))
+        fdt.apply_overlay(base, fdt.load(dtbo), report)
+        report['error'] = None
+    except (ValueError, OSError) as e:
+        report['error'] = str(e)
+    report['ok'] = not (report['unresolved'] or report['missing'] or
+                        report['error'])
+    return report
+
+
+def _key(digests, dtb, dtbo):
+    return '%s:%s' % (digests[dtb], digests[dtbo])
+
+
+def check(dtb, dtbo):
+    # Returns {'ok', 'unresolved', 'missing', 'conflicts', 'error'}
+    digests = {dtb: fio.digest(dtb), dtbo: fio.digest(dtbo)}
+    return cache.overlay_checks.get(_key(digests, dtb, dtbo),
+                                    lambda key: _check(dtb, dtbo))
+
+
+def is_compatible(dtb, dtbo):
+    dtb_compat = fdt.load(dtb).root.props.get('compatible', b'')
+    dtbo_compat = fdt.load(dtbo).root.props.get('compatible', b'')
+    return bool(set(fdt.get_strings(dtb_compat)) &
+                set(fdt.get_strings(dtbo_compat)))
+
+
+def get_matrix(dtbs, dtbos, jobs=None):
+    # Checks every overlay against every base DTB it is compatible with and
+    # returns {(dtb, dtbo): result}. Pairs not in the cache are applied on a
+    # pool of worker processes, as applying overlays is CPU bound.
+    pairs = [(dtb, dtbo) for dtb in dtbs for dtbo in dtbos
+             if is_compatible(dtb, dtbo)]
+    digests = dict((path, fio.digest(path)) for path in set(dtbs + dtbos))
+
+    results = {}
+    for dtb, dtbo in pairs:
+        result = cache.overlay_checks.lookup(_key(digests, dtb, dtbo))
+        if result is not None:
+            results[(dtb, dtbo)] = result
+
+    missing = [pair for pair in pairs if pair not in results]
+    if missing:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+            checked = executor.map(_check, [dtb for dtb, _ in missing],
+                                   [dtbo for _, dtbo in missing],
+                                   chunksize=max(1, len(missing) // 64))
+            for (dtb, dtbo), result in zip(missing, checked):
+                cache.overlay_checks.store(_key(digests, dtb, dtbo), result)
+                results[(dtb, dtbo)] = result
+    return results
+
+
+def describe(result):
+    # Summary of the problems found by check()
+    problems = []
+    if result['error']:
+        problems.append(result['error'].rstrip('!'))
+    if result['unresolved']:
+        problems.append("unresolved labels %s" %
+                        ', '.join(result['unresolved']))
+    if result['missing']:
+        problems.append("no target for %s" % ', '.join(result['missing']))
+    return '; '.join(problems) or "applies cleanly"
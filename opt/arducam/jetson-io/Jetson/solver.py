@@ -0,0 +1,184 @@
+# SPDX-FileCopyrightText: Copyright (c) 2019-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Assigns a set of requested functions (pin groups, e.g. i2s2 or spi1) to
+# the headers of a board. Every header offering a function is a candidate;
+# two candidates conflict when they configure the same SoC pin for
+# different functions, and a candidate is blocked when another header
+# already uses one of its SoC pins for another function. The assignment is
+# found by backtracking over the functions with the fewest remaining
+# candidates first, pruning the candidates that conflict with each choice.
+# If there is none, a minimal set of the requested functions that cannot
+# be enabled together is returned instead.
+
+
+def _get_candidates(board, function, shared):
+    # [{'function', 'header', 'group', 'soc', 'pins', 'disables'}] and the
+    # reasons for the candidates that are blocked
+    candidates = []
+    blocked = []
+    for hdr in board.get_board_headers():
+        header = board.load_header(hdr)
+        available = header.pingroups_available()
+        if function in available:
+            groups = [function]
+        else:
+            groups = [g for g in available
+                      if header.pingroups.get_function(g) == function]
+        for group in groups:
+            names = header.pingroups.get_pins(group)
+            func = header.pingroups.get_function(group)
+            if any(func not in header.pins.get_functions(name)
+                   for name in names):
+                continue
+            soc = dict.fromkeys(names, func)
+            conflicts = shared.get_conflicts(hdr, soc)
+            if conflicts:
+                blocked.extend("%s on %s: %s is used as %s by %s" %
+                               (group, hdr, name, used, other)
+                               for name, _, other, used in conflicts)
+                continue
+            # Groups of the header pingroup_enable() would disable
+            disables = sorted(g for g in available if g != group and
+                              header.pingroups.get_function(g) != func and
+                              header.pingroup_is_enabled(g) and
+                              names & header.pingroups.get_pins(g))
+            candidates.append({'function': function, 'header': hdr,
+                               'group': group, 'soc': soc,
+                               'pins': sorted(header.pins.get_pin_indices(
+                                   names)),
+                               'disables': disables})
+    return candidates, blocked
+
+
+def _conflicts(a, b):
+    for name, function in a['soc'].items():
+        if b['soc'].get(name, function) != function:
+            return True
+    return False
+
+
+def _search(functions, domains, conflicts):
+    # Backtracking with forward checking; domains are lists of candidate
+    # indices, returns {function: candidate index} or None
+    if not functions:
+        return {}
+    function = min(functions, key=lambda f: len(domains[f]))
+    rest = [f for f in functions if f != function]
+    for index in domains[function]:
+        pruned = dict((f, [i for i in domains[f]
+                           if i not in conflicts[index]]) for f in rest)
+        if any(not pruned[f] for f in rest):
+            continue
+        result = _search(rest, pruned, conflicts)
+        if result is not None:
+            result[function] = index
+            return result
+    return None
+
+
+def _solve(functions, candidates, conflicts):
+    domains = dict((f, [i for i, c in enumerate(candidates)
+                        if c['function'] == f]) for f in functions)
+    if any(not domains[f] for f in functions):
+        return None
+    return _search(list(functions), domains, conflicts)
+
+
+def solve(board, functions, prefer=None):
+    # Returns {'ok', 'plan', 'conflicts', 'unknown', 'blocked'}. plan lists
+    # the group to enable on a header for each function, prefer maps
+    # functions to the header to try first. conflicts is a minimal set of
+    # the functions that cannot be enabled together, unknown the functions
+    # no header offers at all.
+    prefer = prefer or {}
+    functions = list(dict.fromkeys(functions))
+    shared = board.get_shared_pins()
+
+    candidates = []
+    blocked = {}
+    unknown = []
+    for function in functions:
+        found, reasons = _get_candidates(board, function, shared)
+        found.sort(key=lambda c: c['header'] != prefer.get(function))
+        candidates.extend(found)
+        if reasons:
+            blocked[function] = reasons
+        if not found and not reasons:
+            unknown.append(function)
+
+    conflicts = [set() for _ in candidates]
+    for i, a in enumerate(candidates):
+        for j in range(i + 1, len(candidates)):
+            if _conflicts(a, candidates[j]):
+                conflicts[i].add(j)
+                conflicts[j].add(i)
+
+    result = {'ok': False, 'plan': None, 'conflicts': [],
+              'unknown': unknown, 'blocked': blocked}
+    if unknown:
+        return result
+
+    assignment = _solve(functions, candidates, conflicts)
+    if assignment is not None:
+        result['ok'] = True
+        result['plan'] = [candidates[assignment[f]] for f in functions]
+        return result
+
+    # Deletion filter: a function is dropped from the conflict set as
+    # long as the remaining ones still cannot be enabled together
+    core = list(functions)
+    for function in functions:
+        rest = [f for f in core if f != function]
+        if _solve(rest, candidates, conflicts) is None:
+            core = rest
+    result['conflicts'] = core
+    return result
+
+
+def apply(board, plan):
+    # Enables the groups of a plan returned by solve(), in one transaction
+    # per header
+    headers = {}
+    for step in plan:
+        headers.setdefault(step['header'], []).append(step['group'])
+    for hdr, groups in headers.items():
+        with board.load_header(hdr).transaction() as t:
+            for group in groups:
+                t.enable(group)
+
+
+def describe(result):
+    if result['ok']:
+        return "all functions assigned"
+    problems = []
+    if result['unknown']:
+        problems.append("no header supports %s" %
+                        ', '.join(result['unknown']))
+    if result['conflicts']:
+        if len(result['conflicts']) == 1:
+            problems.append("%s cannot be enabled" % result['conflicts'][0])
+        else:
+            problems.append("%s cannot be enabled together" %
+                            ', '.join(result['conflicts']))
+        for function in result['conflicts']:
+            problems.extend(result['blocked'].get(function, []))
+    return '; '.join(problems)
@@ -19,6 +19,7 @@
 # DEALINGS IN THE SOFTWARE.
 
 from Utils import fio
+from Utils import perf
 import os
 
 mountpoint = '/sys/kernel/debug'
@@ -30,5 +31,6 @@ def read(fn):
 
     with open(path, 'r') as f:
         lines = f.readlines()
+    perf.record_read('debugfs', sum(len(line) for line in lines))
 
     return lines
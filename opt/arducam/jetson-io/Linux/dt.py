@@ -19,6 +19,7 @@
 # DEALINGS IN THE SOFTWARE.
 
 from Utils import fio
+from Utils import perf
 import os
 
 
@@ -36,6 +37,7 @@ def read_prop(prop):
 
     with open(node, 'r') as f:
         value = f.readline()
+    perf.record_read('sysfs', len(value))
 
     # Return a string of values with a single space delimiter.
     # Note this is equivalent behaviour to the 'fdtget' tool.
@@ -102,6 +102,32 @@ def add_entry(extlinux, label, mlabel, dtb, overlays, default):
         out.append('\n\tOVERLAYS %s' % overlays)
     out.append('\n')
 
+    # Leave the file untouched if the entry is already up to date
+    if ''.join(out) == ''.join(contents):
+        return False
+
     with open(extlinux, 'w') as fout:
         for line in out:
             fout.write(line)
+    return True
+
+
+def get_entry(extlinux, label):
+    # Returns the keywords of a LABEL entry as {keyword: value}, or None
+    # if there is no such entry
+    with open(extlinux, 'r') as fin:
+        contents = fin.readlines()
+
+    entry = None
+    for line in contents:
+        words = line.strip().split(None, 1)
+        if not words or words[0][0] == '#':
+            continue
+        if words[0] == 'LABEL':
+            if entry is not None:
+                break
+            if len(words) > 1 and words[1] == label:
+                entry = {}
+        elif entry is not None and words[0] in _label_keywords:
+            entry[words[0]] = words[1] if len(words) > 1 else ''
+    return entry
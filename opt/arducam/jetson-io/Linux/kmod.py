@@ -0,0 +1,116 @@
+# SPDX-FileCopyrightText: Copyright (c) 2019-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Reads the metadata of kernel modules from their .modinfo section and the
+# modules known to an installed kernel from its modules.dep and
+# modules.builtin files, without running modinfo or modprobe.
+
+from Utils import elf
+import gzip
+import lzma
+import os
+
+
+_modules_path = '/lib/modules'
+
+
+def normalize(name):
+    # Module names use '_' and '-' interchangeably
+    return name.replace('-', '_')
+
+
+def _module_name(path):
+    return normalize(os.path.basename(path).split('.ko')[0])
+
+
+def _load_elf(path):
+    if path.endswith('.ko.xz'):
+        with lzma.open(path, 'rb') as f:
+            return elf.Elf(path, f.read())
+    if path.endswith('.ko.gz'):
+        with gzip.open(path, 'rb') as f:
+            return elf.Elf(path, f.read())
+    return elf.Elf(path)
+
+
+class Module(object):
+    def __init__(self, path):
+        self.path = path
+        binary = _load_elf(path)
+        self.machine = binary.machine
+        self.relocatable = binary.type == elf.ET_REL
+
+        modinfo = binary.get_section('.modinfo')
+        if modinfo is None:
+            raise ValueError("No .modinfo section found in %s!" % path)
+        self.info = {}
+        for entry in elf.get_strings(modinfo):
+            key, _, value = entry.partition('=')
+            self.info.setdefault(key, []).append(value)
+
+        self.name = normalize(self.get('name', _module_name(path)))
+        self.vermagic = self.get('vermagic')
+        self.srcversion = self.get('srcversion')
+        self.depends = [normalize(d) for d in self.get('depends', '').split(',')
+                        if d]
+
+    def get(self, key, default=None):
+        values = self.info.get(key)
+        if not values:
+            return default
+        return values[0]
+
+    def get_release(self):
+        if not self.vermagic:
+            return None
+        return self.vermagic.split()[0]
+
+
+def get_kernel_modules(release):
+    # Returns {name: path} of the modules of an installed kernel release,
+    # including built-in ones, or None if the release is not installed
+    path = os.path.join(_modules_path, release)
+    if not os.path.isdir(path):
+        return None
+
+    modules = {}
+    for fn in 'modules.dep', 'modules.builtin':
+        index = os.path.join(path, fn)
+        if not os.path.exists(index):
+            continue
+        with open(index, 'r') as f:
+            for line in f:
+                module = line.split(':')[0].strip()
+                if module:
+                    modules[_module_name(module)] = os.path.join(path, module)
+    return modules
+
+
+def get_kernel_vermagic(modules):
+    # The vermagic of a kernel is taken from one of its loadable modules
+    for path in sorted(modules.values()):
+        if not os.path.isfile(path):
+            continue
+        try:
+            return Module(path).vermagic
+        except (ValueError, OSError, EOFError, lzma.LZMAError):
+            continue
+    return None
@@ -0,0 +1,161 @@
+# SPDX-FileCopyrightText: Copyright (c) 2019-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Persistent cache of values derived from files, such as the properties of
+# the overlays in /boot/arducam/dts and the pins parsed from them. Values are
+# kept as JSON in cache_dir, one file per cache. A FileCache entry is only
+# used while the file it was derived from keeps its inode, size and mtime,
+# other caches are keyed by the contents (e.g. a hash) of their inputs. The
+# cache is warmed when the package is installed; users that cannot write
+# cache_dir still read it, and simply compute what is missing.
+
+import json
+import os
+import threading
+
+
+cache_dir = '/var/cache/jetson-io'
+
+# Bumped whenever the format of the cached values changes
+VERSION = 2
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+class Cache(object):
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.entries = None
+        self.dirty = False
+
+    def _path(self):
+        return os.path.join(cache_dir, '%s.json' % self.name)
+
+    def _load(self):
+        if self.entries is not None:
+            return
+        self.entries = {}
+        try:
+            with open(self._path(), 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get('version') == VERSION:
+            self.entries = data.get('entries', {})
+
+    def _is_stale(self, key):
+        return False
+
+    def lookup(self, key):
+        with self.lock:
+            self._load()
+            entry = self.entries.get(key)
+        return None if entry is None else entry['value']
+
+    def store(self, key, value):
+        with self.lock:
+            self._load()
+            self.entries[key] = {'value': value}
+            self.dirty = True
+
+    def get(self, key, compute):
+        value = self.lookup(key)
+        if value is None:
+            value = compute(key)
+            self.store(key, value)
+        return value
+
+    def save(self):
+        # Stale entries are dropped. The file is replaced atomically;
+        # without write access to cache_dir nothing is saved.
+        with self.lock:
+            if not self.dirty:
+                return False
+            entries = dict((key, entry) for key, entry in
+                           self.entries.items() if not self._is_stale(key))
+            path = self._path()
+            temp = '%s.%d.tmp' % (path, os.getpid())
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                with open(temp, 'w') as f:
+                    json.dump({'version': VERSION, 'entries': entries}, f)
+                os.replace(temp, path)
+            except OSError:
+                if os.path.exists(temp):
+                    os.remove(temp)
+                return False
+            self.entries = entries
+            self.dirty = False
+        return True
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+            self.dirty = True
+
+
+class FileCache(Cache):
+    def _is_stale(self, path):
+        # Entries of files that no longer exist
+        return not os.path.exists(path)
+
+    def get_many(self, paths, compute, tag=None):
+        # Returns the cached values of the files, calling compute() once
+        # with the list of files without a valid entry. tag identifies how
+        # the value was derived (e.g. the header prefix) and must match too.
+        keys = [_stat_key(path) for path in paths]
+        values = {}
+        with self.lock:
+            self._load()
+            for path, key in zip(paths, keys):
+                entry = self.entries.get(path)
+                if entry and entry['key'] == key and entry.get('tag') == tag:
+                    values[path] = entry['value']
+
+        missing = [path for path in paths if path not in values]
+        if missing:
+            computed = compute(missing)
+            keys = dict(zip(paths, keys))
+            with self.lock:
+                for path, value in zip(missing, computed):
+                    values[path] = value
+                    self.entries[path] = {'key': keys[path], 'tag': tag,
+                                          'value': value}
+                self.dirty = True
+        return [values[path] for path in paths]
+
+    def get(self, path, compute, tag=None):
+        return self.get_many([path], lambda paths: [compute(paths[0])],
+                             tag)[0]
+
+
+# Properties of the overlays found in the boot directory
+overlays = FileCache('overlays')
+# Pin entries of the header overlays, see header.get_pin_entries()
+templates = FileCache('templates')
+# Camera sensors of the overlays, see cameras.get_index()
+cameras = FileCache('cameras')
+# Results of applying overlays to base DTBs, by the hashes of both files
+overlay_checks = Cache('overlay-checks')
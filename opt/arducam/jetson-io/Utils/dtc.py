@@ -18,9 +18,23 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
+from Utils import fdt
 from Utils import syscall
 import glob
 import os
+import shutil
+
+
+# Properties and nodes are read and written in-process unless the external
+# fdtget/fdtput tools are explicitly requested
+_in_process = os.environ.get('JETSON_IO_FDT_BACKEND', 'python') != 'tools'
+
+# Availability of the device-tree tools, looked up on first use
+_tools = {}
+
+
+def in_process():
+    return _in_process
 
 
 def __files_exist(*files):
@@ -29,38 +43,105 @@ def __files_exist(*files):
             raise RuntimeError("File %s not found!" % f)
 
 
-def __prop_exists(dtb, node, prop):
-    return syscall.call('fdtget "%s" "%s" "%s"' % (dtb, node, prop))
+def __tool(name):
+    # Replayed commands are not executed, so the tools need not exist
+    if name not in _tools and not syscall.replaying():
+        _tools[name] = shutil.which(name) is not None
+    if _tools.get(name) is False:
+        raise RuntimeError("Device-tree compiler not found!")
+    return name
+
+
+def __get_node(dtb, node):
+    n = fdt.load(dtb).get_node(node)
+    if n is None:
+        raise RuntimeError("Node %s not found in %s!" % (node, dtb))
+    return n
+
+
+def __get_prop_cmd(dtb, node, prop):
+    return [__tool('fdtget'), dtb, node, prop]
+
+
+def __get_prop(dtb, node, prop, index):
+    # Same as fdtget, a file that cannot be parsed has no properties
+    try:
+        n = fdt.load(dtb).get_node(node)
+    except ValueError:
+        return None
+    if n is None or prop not in n.props:
+        return None
+    values = fdt.format_value(n.props[prop]).splitlines() or ['']
+    if index >= len(values):
+        return None
+    return values[index]
+
+
+def __get_prop_result(result, index):
+    # fdtget fails if the property does not exist
+    if result.returncode:
+        return None
+    values = result.lines()
+    if index >= len(values):
+        return None
+    return values[index]
 
 
 def extract(dtb, dts):
     __files_exist(dtb)
-    if syscall.call('dtc -I dtb -O dts "%s" -o "%s"' % (dtb, dts)):
+    if syscall.call([__tool('dtc'), '-I', 'dtb', '-O', 'dts', dtb,
+                     '-o', dts]):
         raise RuntimeError("Failed to extract %s to %s!" % (dtb, dts))
 
 
 def compile(dts, dtb):
     __files_exist(dts)
-    if syscall.call('dtc -I dts -O dtb "%s" -o "%s"' % (dts, dtb)):
+    if syscall.call([__tool('dtc'), '-I', 'dts', '-O', 'dtb', dts,
+                     '-o', dtb]):
         raise RuntimeError("Failed to compile %s to %s!" % (dts, dtb))
 
 
 def overlay(dtb, out, overlays):
+    # The merged DTB is booted, so it is always written by the fdtoverlay
+    # tool, whatever the backend, and this fails if it is not installed.
+    # The in-process fdt.apply_overlay() is only used for the read-only
+    # checks of Jetson/overlays.py
     for overlay in overlays:
         __files_exist(dtb, overlay)
-    files = ' '.join(overlays)
-    if syscall.call('fdtoverlay -i "%s" -o "%s" %s' % (dtb, out, files)):
-        raise RuntimeError("Failed to overlay %s with %s!" % (dtb, files))
+    if not syscall.replaying() and shutil.which('fdtoverlay') is None:
+        raise RuntimeError("fdtoverlay not found, cannot overlay %s!" % dtb)
+    if syscall.call(['fdtoverlay', '-i', dtb, '-o', out] + list(overlays)):
+        raise RuntimeError("Failed to overlay %s with %s!" %
+                           (dtb, ' '.join(overlays)))
+
+
+def is_equivalent(dtb1, dtb2):
+    # Compares the decompiled, sorted sources of both DTBs so that
+    # differences in the blob layout are ignored
+    __files_exist(dtb1, dtb2)
+    if _in_process:
+        tree1 = fdt.load(dtb1)
+        tree2 = fdt.load(dtb2)
+        return tree1.reserved == tree2.reserved and \
+               tree1.root.canonical() == tree2.root.canonical()
+    dtc = __tool('dtc')
+    sources = syscall.run_batch([[dtc, '-q', '-s', '-I', 'dtb', '-O', 'dts',
+                                  dtb] for dtb in (dtb1, dtb2)])
+    return sources[0].lines() == sources[1].lines()
 
 
 def get_child_nodes(dtb, node):
     __files_exist(dtb)
-    return syscall.call_out('fdtget -l "%s" "%s"' % (dtb, node))
+    if _in_process:
+        return list(__get_node(dtb, node).children)
+    return syscall.call_out([__tool('fdtget'), '-l', dtb, node])
 
 
 def get_child_props(dtb, node):
     __files_exist(dtb)
-    return syscall.call_out('fdtget -p "%s" "%s"' % (dtb, node))
+    if _in_process:
+        return list(__get_node(dtb, node).props)
+    return syscall.call_out([__tool('fdtget'), '-p', dtb, node])
 
 
 def get_compatible(dtb):
@@ -73,42 +154,95 @@ def get_model(dtb):
 
 def get_prop_value(dtb, node, prop, index):
     __files_exist(dtb)
-    if __prop_exists(dtb, node, prop):
-        return None
-    values = syscall.call_out('fdtget "%s" "%s" "%s"' % (dtb, node, prop))
-    if index >= len(values):
-        return None
-    return values[index]
+    if _in_process:
+        return __get_prop(dtb, node, prop, index)
+    return __get_prop_result(syscall.run(__get_prop_cmd(dtb, node, prop)),
+                             index)
+
+
+def get_prop_values(dtbs, node, prop, index):
+    # Same as get_prop_value() for a list of files, queried concurrently
+    __files_exist(*dtbs)
+    if _in_process:
+        return [__get_prop(dtb, node, prop, index) for dtb in dtbs]
+    results = syscall.run_batch([__get_prop_cmd(dtb, node, prop)
+                                 for dtb in dtbs])
+    return [__get_prop_result(result, index) for result in results]
 
 
 def set_prop_value(dtb, node, dtype, prop, value):
+    set_prop_values(dtb, node, dtype, prop, [value])
+
+
+def set_prop_values(dtb, node, dtype, prop, values):
     __files_exist(dtb)
-    if syscall.call('fdtput -t "%s" "%s" "%s" "%s" "%s"' %
-                    (dtype, dtb, node, prop, value)):
-        raise RuntimeError("Failed to get property value for %s%s!" %
+    if _in_process:
+        tree = fdt.load(dtb)
+        n = tree.get_node(node)
+        if n is None:
+            raise RuntimeError("Failed to set property value for %s%s!" %
+                               (node, prop))
+        n.set_prop(prop, fdt.encode_value(dtype, values))
+        fdt.save(tree, dtb)
+        return
+    if syscall.call([__tool('fdtput'), '-t', dtype, dtb, node, prop] +
+                    list(values)):
+        raise RuntimeError("Failed to set property value for %s%s!" %
                            (node, prop))
 
 
+def __walk(dtb, node, with_props):
+    # Lists the whole subtree under node, one level at a time with the
+    # queries for all nodes of a level running concurrently. Returns a
+    # dict of node path -> (child nodes, props)
+    __files_exist(dtb)
+    tree = {}
+    if _in_process:
+        for path, n in __get_node(dtb, node).walk(node):
+            tree[path] = (list(n.children), list(n.props))
+        return tree
+    fdtget = __tool('fdtget')
+    level = [node]
+    while level:
+        cmds = [[fdtget, '-l', dtb, n] for n in level]
+        if with_props:
+            cmds += [[fdtget, '-p', dtb, n] for n in level]
+        results = syscall.run_batch(cmds)
+        next_level = []
+        for i, n in enumerate(level):
+            cnodes = results[i].lines()
+            props = results[len(level) + i].lines() if with_props else []
+            tree[n] = (cnodes, props)
+            next_level.extend("%s%s/" % (n, c) for c in cnodes)
+        level = next_level
+    return tree
+
+
+def count_nodes(dtb, node='/'):
+    return len(__walk(dtb, node, False))
+
+
 def find_nodes_with_prop(dtb, node, prop):
-    match = []
-    cnodes = get_child_nodes(dtb, node)
-    for cnode in cnodes:
-        cpath = "%s%s/" % (node, cnode)
-        match.extend(find_nodes_with_prop(dtb, cpath, prop))
-        props = get_child_props(dtb, cpath)
-        if prop in props:
-            match.append(cpath)
-    return match
+    tree = __walk(dtb, node, True)
+
+    def find(node):
+        match = []
+        for cnode in tree[node][0]:
+            cpath = "%s%s/" % (node, cnode)
+            match.extend(find(cpath))
+            if prop in tree[cpath][1]:
+                match.append(cpath)
+        return match
+
+    return find(node)
 
 
 def find_compatible_dtb_files(compat, model, path):
-    dtbs = []
-    for dtb in glob.glob(os.path.join(path, '*.dtb')):
-        if compat != get_compatible(dtb):
-            continue
-        if model != get_model(dtb):
-            continue
-        dtbs.append(dtb)
+    dtbs = glob.glob(os.path.join(path, '*.dtb'))
+    compats = get_prop_values(dtbs, '/', 'compatible', 0)
+    dtbs = [dtb for dtb, c in zip(dtbs, compats) if c == compat]
+    models = get_prop_values(dtbs, '/', 'model', 0)
+    dtbs = [dtb for dtb, m in zip(dtbs, models) if m == model]
     if not dtbs:
         return None
     return dtbs
@@ -116,8 +250,8 @@ def find_compatible_dtb_files(compat, model, path):
 
 def find_compatible_dtbo_files(compat, path):
     dtbos = []
-    for dtbo in glob.glob(os.path.join(path, '*.dtbo')):
-        c = get_compatible(dtbo)
+    files = glob.glob(os.path.join(path, '*.dtbo'))
+    for dtbo, c in zip(files, get_prop_values(files, '/', 'compatible', 0)):
         if c is None:
             continue
         for c_str in c.split():
@@ -129,14 +263,25 @@ def find_compatible_dtbo_files(compat, path):
 
 def remove_node(dtb, node):
     __files_exist(dtb)
-    return syscall.call('fdtput -r "%s" "%s"' % (dtb, node))
+    if _in_process:
+        tree = fdt.load(dtb)
+        parent, child = tree.get_parent(node)
+        if parent is None:
+            return 1
+        del parent.children[child.name]
+        fdt.save(tree, dtb)
+        return 0
+    return syscall.call([__tool('fdtput'), '-r', dtb, node])
 
 
 def delete_prop(dtb, node, prop):
     __files_exist(dtb)
-    return syscall.call('fdtput -d "%s" "%s" "%s"' % (dtb, node, prop))
-
-
-if syscall.call('which dtc') or syscall.call('which fdtoverlay') or \
-   syscall.call('which fdtget') or syscall.call('which fdtput'):
-    raise RuntimeError("Device-tree compiler not found!")
+    if _in_process:
+        tree = fdt.load(dtb)
+        n = tree.get_node(node)
+        if n is None or prop not in n.props:
+            return 1
+        del n.props[prop]
+        fdt.save(tree, dtb)
+        return 0
+    return syscall.call([__tool('fdtput'), '-d', dtb, node, prop])
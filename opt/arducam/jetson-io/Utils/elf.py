@@ -0,0 +1,100 @@
+# SPDX-FileCopyrightText: Copyright (c) 2019-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Minimal ELF reader, enough to read single sections (e.g. the .modinfo
+# section of a kernel module) without running readelf or modinfo. Only the
+# ELF and section headers and the requested sections are read.
+
+import struct
+
+
+ET_REL = 1
+
+_machines = {3: 'i386', 40: 'arm', 62: 'x86_64', 183: 'aarch64',
+             243: 'riscv'}
+
+
+class Elf(object):
+    def __init__(self, path, data=None):
+        # data may hold the contents of a decompressed file
+        self.path = path
+        self.data = data
+        try:
+            self._parse()
+        except (struct.error, IndexError, UnicodeDecodeError):
+            raise ValueError("Invalid ELF file %s, truncated!" % path)
+
+    def _read(self, offset, size):
+        if self.data is not None:
+            if offset + size > len(self.data):
+                raise IndexError(offset)
+            return self.data[offset:offset + size]
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(size)
+        if len(data) != size:
+            raise IndexError(offset)
+        return data
+
+    def _parse(self):
+        ident = self._read(0, 16)
+        if ident[:4] != b'\x7fELF':
+            raise ValueError("%s is not an ELF file!" % self.path)
+        if ident[4] not in (1, 2) or ident[5] not in (1, 2):
+            raise ValueError("Unsupported ELF class or encoding in %s!" %
+                             self.path)
+        self.is64 = ident[4] == 2
+        endian = '<' if ident[5] == 1 else '>'
+
+        if self.is64:
+            hdr = struct.Struct(endian + 'HHIQQQIHHHHHH')
+        else:
+            hdr = struct.Struct(endian + 'HHIIIIIHHHHHH')
+        (self.type, machine, _, _, _, shoff, _, _, _, _, shentsize, shnum,
+         shstrndx) = hdr.unpack(self._read(16, hdr.size))
+        self.machine = _machines.get(machine, str(machine))
+
+        if self.is64:
+            shdr = struct.Struct(endian + 'IIQQQQIIQQ')
+        else:
+            shdr = struct.Struct(endian + 'IIIIIIIIII')
+        table = self._read(shoff, shentsize * shnum)
+        headers = [shdr.unpack_from(table, i * shentsize)
+                   for i in range(shnum)]
+
+        strtab = headers[shstrndx]
+        names = self._read(strtab[4], strtab[5])
+        self.sections = {}
+        for h in headers:
+            name = names[h[0]:names.index(b'\0', h[0])].decode('utf-8')
+            # (type, offset, size)
+            self.sections[name] = (h[1], h[4], h[5])
+
+    def get_section(self, name):
+        if name not in self.sections:
+            return None
+        _, offset, size = self.sections[name]
+        return self._read(offset, size)
+
+
+def get_strings(data):
+    # NUL separated strings of a section, skipping the padding between them
+    return [s.decode('utf-8', 'replace') for s in data.split(b'\0') if s]
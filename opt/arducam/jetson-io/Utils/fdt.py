@@ -0,0 +1,471 @@
+# SPDX-FileCopyrightText: Copyright (c) 2019-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# In-process reader and writer for flattened device-tree (DTB/DTBO) files,
+# so that properties and nodes can be queried and modified without running
+# fdtget/fdtput for each access, and overlays applied without fdtoverlay.
+
+import copy
+import os
+import re
+import string
+import struct
+import threading
+
+
+FDT_MAGIC = 0xd00dfeed
+FDT_BEGIN_NODE = 1
+FDT_END_NODE = 2
+FDT_PROP = 3
+FDT_NOP = 4
+FDT_END = 9
+
+PHANDLE_PROPS = ['phandle', 'linux,phandle']
+
+_header = struct.Struct('>10I')
+_printable = set(string.printable.encode('ascii')) - set(b'\t\n\r\x0b\x0c')
+
+_lock = threading.Lock()
+_cache = {}
+
+
+def _align(offset):
+    return (offset + 3) & ~3
+
+
+class Node(object):
+    def __init__(self, name):
+        self.name = name
+        self.props = {}
+        self.children = {}
+
+    def add_child(self, name):
+        if name not in self.children:
+            self.children[name] = Node(name)
+        return self.children[name]
+
+    def set_prop(self, name, value):
+        # As with libfdt, a new property is placed before the existing ones
+        if name not in self.props:
+            self.props = dict([(name, value)] + list(self.props.items()))
+        else:
+            self.props[name] = value
+
+    def insert_child(self, name):
+        # As with libfdt, a new node is placed before the existing ones
+        if name not in self.children:
+            self.children = dict([(name, Node(name))] +
+                                 list(self.children.items()))
+        return self.children[name]
+
+    def get_phandle(self):
+        for prop in PHANDLE_PROPS:
+            value = self.props.get(prop)
+            if value is not None and len(value) == 4:
+                return struct.unpack('>I', value)[0]
+        return 0
+
+    def find_child(self, name):
+        if name in self.children:
+            return self.children[name]
+        # As with libfdt, a name without unit address matches a node
+        # with any unit address
+        if '@' not in name:
+            for child in self.children.values():
+                if child.name.split('@')[0] == name:
+                    return child
+        return None
+
+    def walk(self, path='/'):
+        # Yields (path, node) for this node and all nodes below it
+        yield path, self
+        for child in self.children.values():
+            for item in child.walk("%s%s/" % (path, child.name)):
+                yield item
+
+    def canonical(self):
+        return (sorted(self.props.items()),
+                sorted((name, child.canonical())
+                       for name, child in self.children.items()))
+
+
+class Fdt(object):
+    def __init__(self, root=None, reserved=None, boot_cpuid=0):
+        self.root = root if root is not None else Node('')
+        self.reserved = reserved if reserved is not None else []
+        self.boot_cpuid = boot_cpuid
+
+    @classmethod
+    def from_bytes(cls, data):
+        try:
+            return cls._parse(data)
+        except (struct.error, IndexError, UnicodeDecodeError):
+            raise ValueError("Invalid FDT, structure is truncated!")
+
+    @classmethod
+    def _parse(cls, data):
+        if len(data) < _header.size:
+            raise ValueError("Invalid FDT, file too short!")
+        (magic, totalsize, off_struct, off_strings, off_rsvmap, version,
+         last_comp, boot_cpuid, size_strings, _) = _header.unpack_from(data)
+        if magic != FDT_MAGIC:
+            raise ValueError("Invalid FDT magic 0x%x!" % magic)
+        if version < 16:
+            raise ValueError("Unsupported FDT version %d!" % version)
+
+        reserved = []
+        offset = off_rsvmap
+        while True:
+            address, size = struct.unpack_from('>QQ', data, offset)
+            offset += 16
+            if address == 0 and size == 0:
+                break
+            reserved.append((address, size))
+
+        strings = data[off_strings:off_strings + size_strings]
+        root = None
+        stack = []
+        offset = off_struct
+        while True:
+            token, = struct.unpack_from('>I', data, offset)
+            offset += 4
+            if token == FDT_BEGIN_NODE:
+                end = data.index(b'\0', offset)
+                node = Node(data[offset:end].decode('utf-8'))
+                offset = _align(end + 1)
+                if stack:
+                    stack[-1].children[node.name] = node
+                else:
+                    root = node
+                stack.append(node)
+            elif token == FDT_END_NODE:
+                stack.pop()
+            elif token == FDT_PROP:
+                length, nameoff = struct.unpack_from('>II', data, offset)
+                offset += 8
+                name = strings[nameoff:strings.index(b'\0', nameoff)]
+                stack[-1].props[name.decode('utf-8')] = \
+                        bytes(data[offset:offset + length])
+                offset = _align(offset + length)
+            elif token == FDT_NOP:
+                continue
+            elif token == FDT_END:
+                break
+            else:
+                raise ValueError("Invalid FDT token %d!" % token)
+
+        if root is None or stack:
+            raise ValueError("Invalid FDT structure!")
+        return cls(root, reserved, boot_cpuid)
+
+    def to_bytes(self):
+        strings = bytearray()
+        dt_struct = bytearray()
+
+        def string_offset(name):
+            # Strings are shared, including as suffixes, the same way as dtc
+            name = name.encode('utf-8') + b'\0'
+            offset = strings.find(name)
+            if offset < 0:
+                offset = len(strings)
+                strings.extend(name)
+            return offset
+
+        def emit(node):
+            name = node.name.encode('utf-8') + b'\0'
+            dt_struct.extend(struct.pack('>I', FDT_BEGIN_NODE))
+            dt_struct.extend(name.ljust(_align(len(name)), b'\0'))
+            for prop, value in node.props.items():
+                dt_struct.extend(struct.pack('>III', FDT_PROP, len(value),
+                                             string_offset(prop)))
+                dt_struct.extend(value.ljust(_align(len(value)), b'\0'))
+            for child in node.children.values():
+                emit(child)
+            dt_struct.extend(struct.pack('>I', FDT_END_NODE))
+
+        emit(self.root)
+        dt_struct.extend(struct.pack('>I', FDT_END))
+
+        rsvmap = bytearray()
+        for address, size in self.reserved + [(0, 0)]:
+            rsvmap.extend(struct.pack('>QQ', address, size))
+
+        off_rsvmap = _header.size
+        off_struct = off_rsvmap + len(rsvmap)
+        off_strings = off_struct + len(dt_struct)
+        totalsize = off_strings + len(strings)
+        header = _header.pack(FDT_MAGIC, totalsize, off_struct, off_strings,
+                              off_rsvmap, 17, 16, self.boot_cpuid,
+                              len(strings), len(dt_struct))
+        return header + bytes(rsvmap) + bytes(dt_struct) + bytes(strings)
+
+    def get_node(self, path):
+        if not path.startswith('/'):
+            return None
+        node = self.root
+        for name in path.split('/'):
+            if not name:
+                continue
+            node = node.find_child(name)
+            if node is None:
+                return None
+        return node
+
+    def find_phandle(self, phandle):
+        # Returns (path, node) of the node with the given phandle
+        for path, node in self.root.walk():
+            if node.get_phandle() == phandle:
+                return path.rstrip('/') or '/', node
+        return None, None
+
+    def get_max_phandle(self):
+        phandles = [node.get_phandle() for _, node in self.root.walk()]
+        return max([p for p in phandles if p != 0xffffffff] + [0])
+
+    def get_parent(self, path):
+        names = [name for name in path.split('/') if name]
+        if not names:
+            return None, None
+        parent = self.get_node('/' + '/'.join(names[:-1]))
+        if parent is None:
+            return None, None
+        child = parent.find_child(names[-1])
+        if child is None:
+            return None, None
+        return parent, child
+
+
+def is_printable_string(value):
+    # Same check as fdtget uses to decide whether to print strings
+    if not value or value[-1:] != b'\0':
+        return False
+    for s in value[:-1].split(b'\0'):
+        if not s or any(c not in _printable for c in s):
+            return False
+    return True
+
+
+def format_value(value):
+    # Formats a property value as printed by fdtget without a type
+    if not value:
+        return ''
+    if is_printable_string(value):
+        return ' '.join(s.decode('utf-8') for s in value[:-1].split(b'\0'))
+    if len(value) % 4 == 0:
+        cells = struct.unpack('>%di' % (len(value) // 4), value)
+    else:
+        cells = struct.unpack('>%dB' % len(value), value)
+    return ' '.join(str(cell) for cell in cells)
+
+
+def get_strings(value):
+    if not value:
+        return []
+    return [s.decode('utf-8') for s in value.rstrip(b'\0').split(b'\0')]
+
+
+def encode_strings(values):
+    return b''.join(v.encode('utf-8') + b'\0' for v in values)
+
+
+def encode_value(dtype, values):
+    # Encodes values the same way as 'fdtput -t <dtype>'
+    if dtype == 's':
+        return encode_strings(values)
+    size = {'b': 1, 'h': 2}.get(dtype[0], 4) if len(dtype) > 1 else 4
+    fmt = {1: 'B', 2: 'H', 4: 'I'}[size]
+    mask = (1 << (size * 8)) - 1
+    base = 16 if dtype[-1] == 'x' else 0
+    return b''.join(struct.pack('>' + fmt, int(v, base) & mask)
+                    for v in values)
+
+
+def _get_u32(node, prop, offset):
+    value = node.props.get(prop)
+    if value is None or offset + 4 > len(value):
+        raise ValueError("Invalid offset %d of property %s!" % (offset, prop))
+    return struct.unpack_from('>I', value, offset)[0]
+
+
+def _set_u32(node, prop, offset, cell):
+    value = node.props[prop]
+    node.props[prop] = value[:offset] + struct.pack('>I', cell) + \
+                       value[offset + 4:]
+
+
+def _add_u32(node, prop, offset, delta):
+    cell = _get_u32(node, prop, offset) + delta
+    if cell >= 0xffffffff:
+        raise ValueError("Too many phandles!")
+    _set_u32(node, prop, offset, cell)
+
+
+def _update_local_references(node, fixups, delta):
+    # __local_fixups__ mirrors the overlay tree and lists the offsets of
+    # the phandles referring to the overlay's own nodes
+    for prop, offsets in fixups.props.items():
+        for i in range(0, len(offsets) - 3, 4):
+            _add_u32(node, prop, struct.unpack_from('>I', offsets, i)[0],
+                     delta)
+    for name, child in fixups.children.items():
+        if name not in node.children:
+            raise ValueError("Local fixup node %s not found!" % name)
+        _update_local_references(node.children[name], child, delta)
+
+
+def get_fixups(overlay):
+    # Returns the references of an overlay to labels of the base tree as
+    # [(label, path, prop, offset)]
+    fixups = []
+    node = overlay.get_node('/__fixups__')
+    if node is None:
+        return fixups
+    for label, value in node.props.items():
+        for ref in get_strings(value):
+            path, prop, offset = ref.rsplit(':', 2)
+            fixups.append((label, path, prop, int(offset)))
+    return fixups
+
+
+def _get_target(base, fragment):
+    # Returns the path of the base node a fragment applies to, or None
+    target = fragment.props.get('target')
+    if target is not None and len(target) == 4:
+        return base.find_phandle(struct.unpack('>I', target)[0])[0]
+    target_path = fragment.props.get('target-path')
+    if target_path is not None:
+        path = get_strings(target_path)[0] if target_path[:-1] else '/'
+        if base.get_node(path) is not None:
+            return path
+    return None
+
+
+def _merge(target, overlay, path, conflicts):
+    for prop, value in overlay.props.items():
+        # Enabling or disabling a node is what overlays are for
+        if prop in target.props and target.props[prop] != value and \
+           prop != 'status':
+            conflicts.append('%s:%s' % (path, prop))
+        target.set_prop(prop, value)
+    for name, child in overlay.children.items():
+        node = target.find_child(name)
+        if node is None:
+            node = target.insert_child(name)
+        _merge(node, child, '%s/%s' % (path.rstrip('/'), node.name),
+               conflicts)
+
+
+def apply_overlay(base, overlay, report=None):
+    # Applies an overlay to the base tree in place, in the same way as
+    # libfdt's fdt_overlay_apply(). The overlay itself is left untouched.
+    # If report is a dict, unresolved fixups and fragments without target
+    # are listed under 'unresolved' and 'missing' instead of raising, and
+    # base properties changed by the overlay under 'conflicts'.
+    overlay = copy.deepcopy(overlay)
+    if report is not None:
+        for key in 'unresolved', 'missing', 'conflicts':
+            report.setdefault(key, [])
+
+    # The phandles of the overlay are moved above those of the base tree
+    delta = base.get_max_phandle()
+    for _, node in overlay.root.walk():
+        for prop in PHANDLE_PROPS:
+            if prop in node.props:
+                _add_u32(node, prop, 0, delta)
+    local_fixups = overlay.get_node('/__local_fixups__')
+    if local_fixups is not None:
+        _update_local_references(overlay.root, local_fixups, delta)
+
+    symbols = base.get_node('/__symbols__')
+    for label, path, prop, offset in get_fixups(overlay):
+        phandle = 0
+        if symbols is not None and label in symbols.props:
+            node = base.get_node(get_strings(symbols.props[label])[0])
+            if node is not None:
+                phandle = node.get_phandle()
+        if phandle == 0:
+            if report is None:
+                raise ValueError("Unresolved reference to %s!" % label)
+            if label not in report['unresolved']:
+                report['unresolved'].append(label)
+            continue
+        node = overlay.get_node(path)
+        if node is None:
+            raise ValueError("Fixup node %s not found!" % path)
+        _get_u32(node, prop, offset)
+        _set_u32(node, prop, offset, phandle)
+
+    targets = {}
+    conflicts = [] if report is None else report['conflicts']
+    for name, fragment in overlay.root.children.items():
+        node = fragment.children.get('__overlay__')
+        if node is None:
+            continue
+        path = _get_target(base, fragment)
+        if path is None:
+            if report is None:
+                raise ValueError("Target of %s not found!" % name)
+            # Targets referring to unresolved labels are already reported
+            if fragment.props.get('target') != b'\xff\xff\xff\xff':
+                report['missing'].append(name)
+            continue
+        _merge(base.get_node(path), node, path, conflicts)
+        targets[name] = path
+
+    # Labels of the overlay refer to the nodes they were merged into
+    overlay_symbols = overlay.get_node('/__symbols__')
+    if overlay_symbols is None:
+        return base
+    for label, value in overlay_symbols.props.items():
+        res = re.match(r'^/([^/]+)/__overlay__(/.*)?$', get_strings(value)[0])
+        if res is None or res.group(1) not in targets:
+            continue
+        path = targets[res.group(1)].rstrip('/') + (res.group(2) or '')
+        base.root.insert_child('__symbols__').set_prop(
+            label, encode_strings([path or '/']))
+    return base
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def load(path):
+    # Parsed files are cached until the file changes on disk; callers
+    # that modify the returned tree must write it back with save()
+    key = _stat_key(path)
+    with _lock:
+        entry = _cache.get(path)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+    with open(path, 'rb') as f:
+        tree = Fdt.from_bytes(f.read())
+    with _lock:
+        _cache[path] = (key, tree)
+    return tree
+
+
+def save(tree, path):
+    with open(path, 'wb') as f:
+        f.write(tree.to_bytes())
+    with _lock:
+        _cache[path] = (_stat_key(path), tree)
@@ -18,7 +18,9 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
+import hashlib
 import os
+import shutil
 
 
 def __is_accessible(path, flags, desc):
@@ -35,3 +37,26 @@ def is_readable(path):
 
 def is_rw(path):
     __is_accessible(path, os.R_OK | os.W_OK, "read/write")
+
+
+def digest(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def is_identical(src, dst):
+    if not os.path.exists(dst):
+        return False
+    if os.path.getsize(src) != os.path.getsize(dst):
+        return False
+    return digest(src) == digest(dst)
+
+
+def copy_if_changed(src, dst):
+    if is_identical(src, dst):
+        return False
+    shutil.copyfile(src, dst)
+    return True
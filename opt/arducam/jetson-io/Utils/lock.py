@@ -0,0 +1,128 @@
+# SPDX-FileCopyrightText: Copyright (c) 2019-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Advisory locks shared between jetson-io processes. Queries take a shared
+# lock, so that any number of them run in parallel, and commits take an
+# exclusive one. Locks are counted per process, so they may be nested and
+# a shared lock held by the process is converted while an exclusive one is
+# taken. With flock() the conversion is not atomic: the shared lock is
+# dropped before the exclusive one is granted, so another process may
+# commit in between. Anything read from the boot files under the shared
+# lock must be read again once the exclusive lock is held.
+
+import contextlib
+import fcntl
+import os
+import tempfile
+import threading
+
+
+lock_dir = '/run/lock' if os.path.isdir('/run/lock') else tempfile.gettempdir()
+
+# Guards _held only, flock() may block and is called without it. While a
+# thread waits for a lock, other threads wanting the same lock wait for it
+# to be granted, the other locks and all releases go ahead.
+_lock = threading.Condition()
+_held = {}
+
+
+def _path(name):
+    return os.path.join(lock_dir, name + '.lock')
+
+
+def _acquire(name, exclusive):
+    with _lock:
+        while name in _held and _held[name]['pending']:
+            _lock.wait()
+        if name not in _held:
+            try:
+                fd = os.open(_path(name), os.O_RDONLY | os.O_CREAT, 0o644)
+            except OSError:
+                raise RuntimeError("Failed to open lock file %s!" %
+                                   _path(name))
+            _held[name] = {'fd': fd, 'shared': 0, 'exclusive': 0,
+                           'pending': False}
+        state = _held[name]
+
+        if exclusive:
+            needed = state['exclusive'] == 0
+        else:
+            needed = state['shared'] == 0 and state['exclusive'] == 0
+        if not needed:
+            state['exclusive' if exclusive else 'shared'] += 1
+            return
+        state['pending'] = True
+
+    try:
+        fcntl.flock(state['fd'], fcntl.LOCK_EX if exclusive else
+                    fcntl.LOCK_SH)
+    except:
+        # A failed conversion has already dropped the shared lock
+        if exclusive and state['shared']:
+            fcntl.flock(state['fd'], fcntl.LOCK_SH)
+        with _lock:
+            state['pending'] = False
+            if state['shared'] == 0 and state['exclusive'] == 0:
+                os.close(state['fd'])
+                del _held[name]
+            _lock.notify_all()
+        raise
+
+    with _lock:
+        state['pending'] = False
+        state['exclusive' if exclusive else 'shared'] += 1
+        _lock.notify_all()
+
+
+def _release(name, exclusive):
+    # Downgrading and unlocking never block, so they are done under _lock.
+    # While another thread converts the lock to an exclusive one, the lock
+    # is left to it.
+    with _lock:
+        state = _held[name]
+        state['exclusive' if exclusive else 'shared'] -= 1
+        if state['exclusive'] or state['pending']:
+            return
+        if state['shared']:
+            if exclusive:
+                fcntl.flock(state['fd'], fcntl.LOCK_SH)
+            return
+        fcntl.flock(state['fd'], fcntl.LOCK_UN)
+        os.close(state['fd'])
+        del _held[name]
+
+
+@contextlib.contextmanager
+def shared(name='jetson-io'):
+    _acquire(name, False)
+    try:
+        yield
+    finally:
+        _release(name, False)
+
+
+@contextlib.contextmanager
+def exclusive(name='jetson-io'):
+    _acquire(name, True)
+    try:
+        yield
+    finally:
+        _release(name, True)
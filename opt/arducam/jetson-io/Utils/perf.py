@@ -0,0 +1,218 @@
+# SPDX-FileCopyrightText: Copyright (c) 2019-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Opt-in instrumentation of the tool. It is enabled either by setting the
+# JETSON_IO_PROFILE environment variable to 'table' or 'json', or by calling
+# enable(), and reports the time spent in each phase, the external commands
+# run, the bytes read from sysfs and debugfs and the critical paths of
+# concurrent steps on exit.
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+
+FORMATS = ['table', 'json']
+
+# Upper bounds (in ms) of the command latency histogram buckets
+_buckets = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+_lock = threading.Lock()
+_local = threading.local()
+_format = None
+_spans = []
+_commands = {}
+_reads = {}
+_paths = {}
+
+
+def enable(fmt='table'):
+    global _format
+
+    if fmt not in FORMATS:
+        raise ValueError("Unknown profile format %s!" % fmt)
+    if _format is None:
+        atexit.register(report)
+    _format = fmt
+
+
+def enabled():
+    return _format is not None
+
+
+def current():
+    # Innermost open span of the calling thread, if any
+    spans = getattr(_local, 'spans', None)
+    return spans[-1] if spans else None
+
+
+class span(object):
+    # parent places spans run on worker threads under the caller's span.
+    # The external commands run by a thread are counted in its open spans
+    # and their parents only, so spans overlapping on other threads do not
+    # count them.
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+
+    def __enter__(self):
+        if not enabled():
+            return self
+        if not hasattr(_local, 'spans'):
+            _local.spans = []
+        if self.parent is None:
+            self.parent = current()
+        self.depth = self.parent.depth + 1 if self.parent else 0
+        self.calls = 0
+        _local.spans.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if not hasattr(self, 'start'):
+            return False
+        duration = time.perf_counter() - self.start
+        _local.spans.remove(self)
+        with _lock:
+            _spans.append({'name': self.name,
+                           'depth': self.depth,
+                           'start': self.start,
+                           'time': duration,
+                           'calls': self.calls})
+        return False
+
+
+def record_call(cmd, duration):
+    if not enabled():
+        return
+    if isinstance(cmd, str):
+        cmd = cmd.split()
+    verb = os.path.basename(cmd[0]) if cmd else ''
+    with _lock:
+        owner = current()
+        while owner is not None:
+            owner.calls += 1
+            owner = owner.parent
+        if verb not in _commands:
+            _commands[verb] = {'count': 0, 'time': 0.0, 'max': 0.0,
+                               'histogram': [0] * (len(_buckets) + 1)}
+        stats = _commands[verb]
+        stats['count'] += 1
+        stats['time'] += duration
+        stats['max'] = max(stats['max'], duration)
+        ms = duration * 1000
+        for index, bound in enumerate(_buckets):
+            if ms < bound:
+                break
+        else:
+            index = len(_buckets)
+        stats['histogram'][index] += 1
+
+
+def record_read(source, nbytes):
+    if not enabled():
+        return
+    with _lock:
+        _reads[source] = _reads.get(source, 0) + nbytes
+
+
+def record_path(name, steps):
+    # steps: [(name, duration)] of a critical path
+    if not enabled():
+        return
+    with _lock:
+        _paths[name] = list(steps)
+
+
+def get_report():
+    with _lock:
+        spans = sorted(_spans, key=lambda s: s['start'])
+        return {
+            'spans': [{'name': s['name'], 'depth': s['depth'],
+                       'time_ms': round(s['time'] * 1000, 3),
+                       'calls': s['calls']} for s in spans],
+            'commands': dict((verb, {
+                'count': stats['count'],
+                'time_ms': round(stats['time'] * 1000, 3),
+                'max_ms': round(stats['max'] * 1000, 3),
+                'histogram': dict(zip(
+                    ['<%dms' % b for b in _buckets] +
+                    ['>=%dms' % _buckets[-1]], stats['histogram']))})
+                for verb, stats in sorted(_commands.items())),
+            'reads': dict(_reads),
+            'critical_paths': dict((name, [{'name': step,
+                                            'time_ms': round(t * 1000, 3)}
+                                           for step, t in steps])
+                                   for name, steps in _paths.items()),
+        }
+
+
+def _format_table(data):
+    lines = []
+    lines.append("%-40s %10s %6s" % ('Phase', 'Time (ms)', 'Calls'))
+    for s in data['spans']:
+        name = '  ' * s['depth'] + s['name']
+        lines.append("%-40s %10.1f %6d" % (name, s['time_ms'], s['calls']))
+
+    lines.append('')
+    lines.append("%-12s %6s %10s %9s %9s  %s" %
+                 ('Command', 'Count', 'Time (ms)', 'Mean (ms)', 'Max (ms)',
+                  'Histogram (' + ' '.join('<%d' % b for b in _buckets) +
+                  ' >=%d ms)' % _buckets[-1]))
+    for verb, stats in data['commands'].items():
+        lines.append("%-12s %6d %10.1f %9.2f %9.2f  %s" %
+                     (verb, stats['count'], stats['time_ms'],
+                      stats['time_ms'] / stats['count'], stats['max_ms'],
+                      ' '.join(map(str, stats['histogram'].values()))))
+
+    lines.append('')
+    for source, nbytes in sorted(data['reads'].items()):
+        lines.append("Read %d bytes from %s" % (nbytes, source))
+
+    for name, steps in sorted(data['critical_paths'].items()):
+        lines.append('')
+        lines.append("Critical path of %s (%.1f ms):" %
+                     (name, sum(s['time_ms'] for s in steps)))
+        for step in steps:
+            lines.append("  %-38s %10.1f" % (step['name'], step['time_ms']))
+    return '\n'.join(lines)
+
+
+def report(out=None):
+    if not enabled():
+        return
+    if out is None:
+        out = sys.stderr
+    data = get_report()
+    if _format == 'json':
+        out.write(json.dumps(data, indent=2) + '\n')
+    else:
+        out.write(_format_table(data) + '\n')
+
+
+if os.environ.get('JETSON_IO_PROFILE'):
+    if os.environ['JETSON_IO_PROFILE'] in FORMATS:
+        enable(os.environ['JETSON_IO_PROFILE'])
+    else:
+        enable()
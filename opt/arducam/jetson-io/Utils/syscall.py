@@ -18,17 +18,196 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
+from Utils import fio
+from Utils import perf
+import base64
+import concurrent.futures
+import json
 import os
+import shlex
 import subprocess
+import threading
+import time
+
+
+# Commands are given either as an argv list, which is executed directly,
+# or as a string, which is executed through the shell. Independent
+# commands can be submitted to run concurrently, with the number of
+# commands running at once bounded by JETSON_IO_JOBS (default: no. CPUs)
+_jobs = int(os.environ.get('JETSON_IO_JOBS', 0)) or os.cpu_count() or 1
+_executor = None
+
+# Calls can be recorded to a trace file (JSON lines, one call per line)
+# and later replayed from it without executing anything, by setting
+# JETSON_IO_RECORD or JETSON_IO_REPLAY to the path of the trace file
+_lock = threading.Lock()
+_record = None
+_replay = None
+
+
+class Result(object):
+    def __init__(self, cmd, returncode, output):
+        self.cmd = cmd
+        self.returncode = returncode
+        self.output = output
+
+    def lines(self):
+        if self.returncode:
+            raise subprocess.CalledProcessError(self.returncode, self.cmd,
+                                                self.output)
+        return self.output.decode('utf-8').splitlines()
+
+
+def record(path):
+    global _record
+    _record = open(path, 'w')
+
+
+def replay(path):
+    global _replay
+    _replay = {}
+    with open(path, 'r') as f:
+        for line in f:
+            entry = json.loads(line)
+            _replay.setdefault(entry['cmd'], []).append(entry)
+
+
+def replaying():
+    return _replay is not None
+
+
+def set_jobs(jobs):
+    global _jobs, _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+        _jobs = max(1, jobs)
+
+
+def _cmd_str(cmd):
+    if isinstance(cmd, str):
+        return cmd
+    return ' '.join(shlex.quote(arg) for arg in cmd)
+
+
+def _touched_files(cmd):
+    if isinstance(cmd, str):
+        try:
+            cmd = shlex.split(cmd)
+        except ValueError:
+            cmd = cmd.split()
+    return [arg for arg in cmd[1:] if os.path.isfile(arg)]
+
+
+def _hash_files(files):
+    hashes = {}
+    for f in files:
+        hashes[f] = fio.digest(f) if os.path.isfile(f) else None
+    return hashes
+
+
+def _record_call(cmd, ret, stdout, stderr, duration, before):
+    files = set(before.keys())
+    files.update(_touched_files(cmd))
+    after = _hash_files(files)
+    outputs = {}
+    for f in files:
+        if after[f] is not None and after[f] != before.get(f):
+            with open(f, 'rb') as fin:
+                outputs[f] = base64.b64encode(fin.read()).decode('ascii')
+
+    entry = {
+        'cmd': _cmd_str(cmd),
+        'exit': ret,
+        'stdout': stdout.decode('utf-8', 'replace'),
+        'stderr': stderr.decode('utf-8', 'replace'),
+        'time': duration,
+        'files': dict((f, {'before': before.get(f), 'after': after[f]})
+                      for f in sorted(files)),
+        'outputs': outputs,
+    }
+    with _lock:
+        _record.write(json.dumps(entry) + '\n')
+        _record.flush()
+
+
+def _replay_call(cmd):
+    with _lock:
+        entries = _replay.get(_cmd_str(cmd))
+        if not entries:
+            raise RuntimeError("No recorded result for '%s'!" % _cmd_str(cmd))
+        entry = entries.pop(0)
+
+    for f, content in entry['outputs'].items():
+        with open(f, 'wb') as fout:
+            fout.write(base64.b64decode(content))
+    for f, hashes in entry['files'].items():
+        if hashes['after'] is None and os.path.isfile(f):
+            os.remove(f)
+
+    perf.record_call(cmd, entry['time'])
+    return entry['exit'], entry['stdout'].encode('utf-8')
+
+
+def _run(cmd, stdout, stderr):
+    if _replay is not None:
+        return _replay_call(cmd)
+
+    if _record is not None:
+        before = _hash_files(_touched_files(cmd))
+        stdout = stderr = subprocess.PIPE
+
+    start = time.perf_counter()
+    try:
+        proc = subprocess.run(cmd, shell=isinstance(cmd, str),
+                              stdout=stdout, stderr=stderr)
+        ret, out, err = proc.returncode, proc.stdout, proc.stderr
+    except OSError:
+        # Same exit code as the shell gives for a command not found
+        ret, out, err = 127, b'', b''
+    duration = time.perf_counter() - start
+    perf.record_call(cmd, duration)
+
+    if _record is not None:
+        _record_call(cmd, ret, out, err, duration, before)
+    return ret, out
+
+
+def run(cmd):
+    ret, output = _run(cmd, subprocess.PIPE, subprocess.DEVNULL)
+    return Result(cmd, ret, output)
+
+
+def submit(cmd):
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(_jobs)
+        executor = _executor
+    return executor.submit(run, cmd)
+
+
+def run_batch(cmds):
+    # Results are returned in the same order as the commands
+    if len(cmds) < 2:
+        return [run(cmd) for cmd in cmds]
+    return [future.result() for future in [submit(cmd) for cmd in cmds]]
 
 
 # syscall: Performs system call and return error code from call
 def call(cmd):
-    with open(os.devnull, 'w') as dnull:
-        return subprocess.call(cmd, shell=True, stdout=dnull, stderr=dnull)
+    ret, _ = _run(cmd, subprocess.DEVNULL, subprocess.DEVNULL)
+    return ret
 
 
 # syscall: Performs system call and returns output
 def call_out(cmd):
-    output = subprocess.check_output(cmd, shell=True)
-    return output.decode('utf-8').splitlines()
+    ret, output = _run(cmd, subprocess.PIPE, None)
+    return Result(cmd, ret, output).lines()
+
+
+if os.environ.get('JETSON_IO_REPLAY'):
+    replay(os.environ['JETSON_IO_REPLAY'])
+elif os.environ.get('JETSON_IO_RECORD'):
+    record(os.environ['JETSON_IO_RECORD'])
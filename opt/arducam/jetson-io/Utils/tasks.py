@@ -0,0 +1,93 @@
+# SPDX-FileCopyrightText: Copyright (c) 2019-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Runs a set of functions as a dependency graph on a thread pool, so that
+# independent steps (mostly waiting on external commands, sysfs and debugfs)
+# overlap. Each task is called with the results of its dependencies, in the
+# order they are listed, and the critical path of the run is recorded.
+
+from Utils import perf
+import concurrent.futures
+import time
+
+
+class Graph(object):
+    def __init__(self, name):
+        self.name = name
+        self.tasks = {}
+        self.results = {}
+        self.times = {}
+        self.parent = None
+
+    def add(self, name, fn, deps=()):
+        for dep in deps:
+            if dep not in self.tasks:
+                raise NameError("Unknown dependency %s of task %s!" %
+                                (dep, name))
+        self.tasks[name] = (fn, list(deps))
+
+    def _call(self, name):
+        fn, deps = self.tasks[name]
+        start = time.perf_counter()
+        try:
+            with perf.span(name, self.parent):
+                return fn(*[self.results[dep] for dep in deps])
+        finally:
+            self.times[name] = (start, time.perf_counter())
+
+    def run(self):
+        pending = dict(self.tasks)
+        running = {}
+        self.parent = perf.current()
+        with concurrent.futures.ThreadPoolExecutor(len(self.tasks) or 1) \
+                as executor:
+            try:
+                while pending or running:
+                    for name in list(pending):
+                        deps = pending[name][1]
+                        if all(dep in self.results for dep in deps):
+                            del pending[name]
+                            running[executor.submit(self._call, name)] = name
+                    done, _ = concurrent.futures.wait(running,
+                            return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        self.results[running.pop(future)] = future.result()
+            except:
+                # Nothing new is started once a task fails; the executor
+                # waits for the ones already running before re-raising
+                pending.clear()
+                raise
+        perf.record_path(self.name, self.critical_path())
+        return self.results
+
+    def critical_path(self):
+        # Walks back from the task finishing last, through the dependency
+        # that finished last, and returns [(task, duration)]
+        if not self.times:
+            return []
+        path = []
+        name = max(self.times, key=lambda n: self.times[n][1])
+        while name is not None:
+            start, end = self.times[name]
+            path.insert(0, (name, end - start))
+            deps = self.tasks[name][1]
+            name = max(deps, key=lambda n: self.times[n][1]) if deps else None
+        return path
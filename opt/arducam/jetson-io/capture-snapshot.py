@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: Copyright (c) 2019-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import argparse
+import socket
+from Jetson import fleet
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        "Capture a snapshot of the board for generate-fleet.py")
+    parser.add_argument("-o", "--out", required=True,
+                        help="Directory of the snapshot")
+    parser.add_argument("-n", "--name", default=socket.gethostname(),
+                        help="Name of the device (default: %(default)s)")
+    parser.add_argument("-d", "--dir", default='/boot/arducam/dts',
+                        help="Directory of the overlays "
+                             "(default: %(default)s)")
+    args = parser.parse_args()
+
+    info = fleet.capture(args.out, args.name, args.dir)
+    print("Captured %s (%s) to %s." % (info['name'], info['model'], args.out))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: Copyright (c) 2019-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import argparse
+import collections
+import glob
+import lzma
+import os
+import sys
+from Linux import kmod
+from Utils import perf
+from Utils import tasks
+
+
+def load_module(path):
+    try:
+        return kmod.Module(path)
+    # Corrupt or truncated compressed modules fail to decompress
+    except (ValueError, OSError, EOFError, lzma.LZMAError) as e:
+        return str(e)
+
+
+def load_kernel(release):
+    modules = kmod.get_kernel_modules(release)
+    if modules is None:
+        return None, None
+    return modules, kmod.get_kernel_vermagic(modules)
+
+
+def check_module(module, release, machine, kernel, vermagic, shipped):
+    # Returns the problems found with a module and notes about it
+    errors = []
+    notes = []
+    if not module.relocatable:
+        errors.append("not a loadable kernel module")
+    if machine and module.machine != machine:
+        errors.append("built for %s, expected %s" % (module.machine, machine))
+    if module.get_release() != release:
+        errors.append("built for kernel %s, expected %s" %
+                      (module.get_release(), release))
+    elif vermagic and module.vermagic != vermagic:
+        errors.append("vermagic '%s' does not match the kernel's '%s'" %
+                      (module.vermagic, vermagic))
+
+    # The shipped modules are expected to come from a single build
+    common = collections.Counter(m.vermagic for m in shipped).most_common(1)
+    if common and module.vermagic != common[0][0]:
+        errors.append("vermagic '%s' differs from the other modules' '%s'" %
+                      (module.vermagic, common[0][0]))
+
+    names = [m.name for m in shipped]
+    if names.count(module.name) > 1:
+        errors.append("more than one module named %s" % module.name)
+
+    if kernel is not None:
+        missing = [d for d in module.depends
+                   if d not in names and d not in kernel]
+        if missing:
+            errors.append("unresolved dependencies: %s" % ', '.join(missing))
+        if module.name in kernel:
+            notes.append("replaces %s" % kernel[module.name])
+    return errors, notes
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        "Check kernel modules against the kernel they are loaded into")
+    parser.add_argument("modules", nargs='*',
+                        default=sorted(glob.glob('/boot/arducam/*.ko')),
+                        help="Kernel modules (default: /boot/arducam/*.ko)")
+    parser.add_argument("-k", "--kernel", default=os.uname().release,
+                        help="Kernel release (default: %(default)s)")
+    parser.add_argument("-m", "--machine", default=os.uname().machine,
+                        help="Machine the modules are built for "
+                             "(default: %(default)s)")
+    parser.add_argument("--profile", choices=perf.FORMATS,
+                        help="Report timing and command statistics on exit")
+    args = parser.parse_args()
+
+    if args.profile:
+        perf.enable(args.profile)
+
+    if not args.modules:
+        raise RuntimeError("No kernel modules to check!")
+
+    # All modules and the kernel's module index are read concurrently
+    graph = tasks.Graph('check modules')
+    graph.add('kernel', lambda: load_kernel(args.kernel))
+    for path in args.modules:
+        graph.add(path, lambda path=path: load_module(path))
+    results = graph.run()
+
+    kernel, vermagic = results['kernel']
+    shipped = [results[p] for p in args.modules
+               if isinstance(results[p], kmod.Module)]
+    if kernel is None:
+        print("Kernel %s is not installed, dependencies are not checked." %
+              args.kernel)
+
+    failed = 0
+    for path in args.modules:
+        module = results[path]
+        if not isinstance(module, kmod.Module):
+            print("%s: FAILED, %s" % (path, module))
+            failed += 1
+            continue
+
+        errors, notes = check_module(module, args.kernel, args.machine,
+                                     kernel, vermagic, shipped)
+        if errors:
+            failed += 1
+            print("%s: FAILED, %s" % (path, '; '.join(errors)))
+        else:
+            print("%s: OK, %s" % (path, module.vermagic))
+        for note in notes:
+            print("  %s" % note)
+
+    if failed:
+        print("%d of %d modules do not match kernel %s!" %
+              (failed, len(args.modules), args.kernel))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: Copyright (c) 2019-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import argparse
+import glob
+import json
+import os
+import sys
+from Jetson import overlays
+from Utils import cache
+from Utils import perf
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        "Check which overlays apply to which base DTBs")
+    parser.add_argument("-d", "--dir", default='/boot/arducam/dts',
+                        help="Directory of the overlays and DTBs "
+                             "(default: %(default)s)")
+    parser.add_argument("--dtb", nargs='+',
+                        help="Base DTBs to check (default: the DTBs in the "
+                             "directory and its dtb subdirectory)")
+    parser.add_argument("-j", "--jobs", type=int,
+                        help="Number of worker processes")
+    parser.add_argument("-v", "--verbose", action='store_true',
+                        help="Also list the overlays that apply and the "
+                             "properties they change")
+    parser.add_argument("--json", action='store_true',
+                        help="Print the matrix as JSON")
+    parser.add_argument("--profile", choices=perf.FORMATS,
+                        help="Report timing and command statistics on exit")
+    args = parser.parse_args()
+
+    if args.profile:
+        perf.enable(args.profile)
+
+    dtbs = args.dtb or sorted(glob.glob(os.path.join(args.dir, '*.dtb')) +
+                              glob.glob(os.path.join(args.dir, 'dtb',
+                                                     '*.dtb')))
+    dtbos = sorted(glob.glob(os.path.join(args.dir, '*.dtbo')))
+    if not dtbs or not dtbos:
+        raise RuntimeError("No DTBs or overlays found in %s!" % args.dir)
+
+    with perf.span('overlay matrix'):
+        matrix = overlays.get_matrix(dtbs, dtbos, args.jobs)
+    cache.overlay_checks.save()
+
+    if args.json:
+        out = {}
+        for (dtb, dtbo), result in sorted(matrix.items()):
+            out.setdefault(dtb, {})[dtbo] = result
+        print(json.dumps(out, indent=2))
+    else:
+        for dtb in dtbs:
+            results = sorted((dtbo, result) for (d, dtbo), result
+                             in matrix.items() if d == dtb)
+            ok = [dtbo for dtbo, result in results if result['ok']]
+            print("%s: %d of %d compatible overlays apply" %
+                  (dtb, len(ok), len(results)))
+            for dtbo, result in results:
+                if not result['ok']:
+                    print("  FAILED %s: %s" % (os.path.basename(dtbo),
+                                               overlays.describe(result)))
+                elif args.verbose:
+                    print("  OK %s" % os.path.basename(dtbo))
+                if args.verbose and result['conflicts']:
+                    print("    changes %s" % ', '.join(result['conflicts']))
+
+    if not all(result['ok'] for result in matrix.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -23,6 +23,8 @@
 
 import argparse
 from Jetson import board
+from Jetson import solver
+from Utils import perf
 import sys
 import re
 import os
@@ -55,44 +57,57 @@ def show_functions_enabled(jetson, functions):
         show_functions(jetson, enabled)
 
 
-def configure_dt(jetson, dtbos):
-    messages = jetson.configure_dt_for_next_boot(dtbos)
+def configure_dt(jetson, dtbos, merge=False, both_slots=False):
+    messages = jetson.configure_dt_for_next_boot(dtbos, merge, both_slots)
     for message in messages:
         print(message)
     print("Reboot system to reconfigure.")
 
 
-def check_generate_jetson_io_pinmux(jetson, header):
+def check_generate_jetson_io_pinmux(jetson, header, minimal=False):
     if not jetson.preconf_pins_avail(header):
         return None
 
     jetson.set_active_header(header)
-    return jetson.create_dtbo_for_header()
+    return jetson.create_dtbo_for_header(minimal)
 
 
-def configure_jetson(jetson, out, header, functions):
-    dtbo = None
+def print_saved(jetson, dtbo, minimal):
+    if minimal:
+        nodes, size = jetson.get_dtbo_stats(dtbo)
+        print("Configuration saved to %s (%d nodes, %d bytes)." %
+              (dtbo, nodes, size))
+    else:
+        print("Configuration saved to %s." % dtbo)
 
-    if functions:
-        jetson.set_active_header(header)
-        available = jetson.header.pingroups_available()
 
+def enable_functions(jetson, header, functions):
+    jetson.set_active_header(header)
+    available = jetson.header.pingroups_available()
+
+    with jetson.header.transaction() as t:
         for function in functions:
             if function not in available:
                 raise NameError("Function %s is not supported on %s!" \
                                 % (function, header))
-            jetson.header.pingroup_enable(function)
+            t.enable(function)
+
+
+def configure_jetson(jetson, out, header, functions, minimal=False):
+    dtbo = None
 
+    if functions:
+        jetson.set_active_header(header)
         if not jetson.header.pins_are_default():
-            dtbo = jetson.create_dtbo_for_header()
+            dtbo = jetson.create_dtbo_for_header(minimal)
 
     if (dtbo is None) and (out == 'dt'):
         # Below ensures that changes made to headers (and written
         # to DTB) in earlier sessions of the tool are retained
-        dtbo = check_generate_jetson_io_pinmux(jetson, header)
+        dtbo = check_generate_jetson_io_pinmux(jetson, header, minimal)
 
     if dtbo and (out == 'dtbo'):
-        print("Configuration saved to %s." % dtbo)
+        print_saved(jetson, dtbo, minimal)
 
     return dtbo
 
@@ -119,6 +134,41 @@ def parse_function_args(func_args, num_headers):
     return funcs
 
 
+def solve_function_args(jetson, headers, func_args):
+    # Functions given as <header-num>="<funcs>" are preferably assigned to
+    # that header, others to whichever header supports them
+    functions = []
+    prefer = {}
+    for arg in func_args:
+        res = re.match(r'([0-9]+)=(.+)', arg)
+        if res:
+            idx = int(res.groups()[0]) - 1
+            if (idx < 0) or (idx >= len(headers)):
+                raise IndexError("Invalid Header number %d!" % (idx + 1))
+            for func in res.groups()[1].split():
+                prefer[func] = headers[idx]
+                functions.append(func)
+        else:
+            functions += arg.split()
+
+    result = solver.solve(jetson, functions, prefer)
+    if not result['ok']:
+        raise RuntimeError("No assignment of the functions found: %s!" %
+                           solver.describe(result))
+
+    funcs = [None] * len(headers)
+    print("Function assignment:")
+    for step in result['plan']:
+        print("  %s: %s on %s (pins %s)" %
+              (step['function'], step['group'], step['header'],
+               ','.join(map(str, step['pins']))))
+        if step['disables']:
+            print("    disables %s" % ', '.join(step['disables']))
+        idx = headers.index(step['header'])
+        funcs[idx] = (funcs[idx] or []) + [step['group']]
+    return funcs, result['plan']
+
+
 def main():
     parser = argparse.ArgumentParser("Configure Jetson expansion headers")
     main = parser.add_mutually_exclusive_group(required=True)
@@ -126,11 +176,26 @@ def main():
                       help="List supported functions")
     main.add_argument("-o", "--out", choices=['dt', 'dtbo'],
                       help="Apply DT changes on boot or Output DTBO file(s)")
+    parser.add_argument("-m", "--minimal", action='store_true',
+                        help="Only include modified pins in the DTBO file(s)")
+    parser.add_argument("--merge", action='store_true',
+                        help="Merge the DTBO file(s) into the DTB on save")
+    parser.add_argument("--both-slots", action='store_true',
+                        help="Apply DT changes to both A/B rootfs slots")
+    parser.add_argument("-s", "--solve", action='store_true',
+                        help="Assign the functions to the headers "
+                             "supporting them")
     parser.add_argument('functions', nargs='*',
                         help="<header-num>=\"<func1> <func2>\" ...")
+    parser.add_argument("--profile", choices=perf.FORMATS,
+                        help="Report timing and command statistics on exit")
     args = parser.parse_args()
 
-    jetson = board.Board()
+    if args.profile:
+        perf.enable(args.profile)
+
+    # Listing only queries the pins, so the board is opened read-only
+    jetson = board.Board(readonly=bool(args.list))
     headers = jetson.get_board_headers()
 
     if len(headers) == 0:
@@ -157,7 +222,17 @@ def main():
     # functions
     if not args.functions:
         raise RuntimeError("No function list specified!")
-    funcs = parse_function_args(args.functions, len(headers))
+    # Functions are enabled on all headers first, so that a SoC pin shared
+    # by two headers is reported before any DTBO is written
+    if args.solve:
+        funcs, plan = solve_function_args(jetson, headers, args.functions)
+        solver.apply(jetson, plan)
+    else:
+        funcs = parse_function_args(args.functions, len(headers))
+        for header in headers:
+            idx = headers.index(header)
+            if funcs[idx]:
+                enable_functions(jetson, header, funcs[idx])
 
     try:
         dtbos = []
@@ -166,11 +241,12 @@ def main():
         for header in headers:
             idx = headers.index(header)
 
-            dtbo = configure_jetson(jetson, args.out, header, funcs[idx])
+            dtbo = configure_jetson(jetson, args.out, header, funcs[idx],
+                                    args.minimal)
             if dtbo:
                 dtbos.append(dtbo)
         if (args.out == 'dt') and (len(dtbos) >= 1):
-            configure_dt(jetson, dtbos)
+            configure_dt(jetson, dtbos, args.merge, args.both_slots)
     except:
         delete_dtbos = True
         raise
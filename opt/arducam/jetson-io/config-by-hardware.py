@@ -22,6 +22,8 @@
 
 import argparse
 from Jetson import board
+from Jetson import overlays
+from Utils import perf
 import sys
 import re
 import os
@@ -40,8 +42,8 @@ def show_hardware(jetson, header):
         print("  %d. %s" % (index + 1, hw))
 
 
-def configure_dt(jetson, dtbos):
-    messages = jetson.configure_dt_for_next_boot(dtbos)
+def configure_dt(jetson, dtbos, merge=False, both_slots=False):
+    messages = jetson.configure_dt_for_next_boot(dtbos, merge, both_slots)
     for message in messages:
         print(message)
     print("Reboot system to reconfigure.")
@@ -52,6 +54,10 @@ def configure_jetson(jetson, header, hw):
     hwlist = jetson.hw_addon_get()
 
     if hw not in hwlist:
+        if hw in jetson.hw_addons.keys():
+            result = jetson.hw_addon_check(hw)
+            raise RuntimeError("Overlay for %s does not apply to %s: %s!" \
+                               % (hw, jetson.dtb, overlays.describe(result)))
         raise NameError("No configuration found for %s on %s!" \
                         % (hw, header))
 
@@ -90,9 +96,19 @@ def main():
                        help="<header-num>=\"<hw-module>\" ...")
     group.add_argument("-l", "--list", help="List of hardware modules",
                        action='store_true')
+    parser.add_argument("--merge", action='store_true',
+                        help="Merge the DTBO file(s) into the DTB on save")
+    parser.add_argument("--both-slots", action='store_true',
+                        help="Apply DT changes to both A/B rootfs slots")
+    parser.add_argument("--profile", choices=perf.FORMATS,
+                        help="Report timing and command statistics on exit")
     args = parser.parse_args()
 
-    jetson = board.Board()
+    if args.profile:
+        perf.enable(args.profile)
+
+    # Listing only queries the hardware, so the board is opened read-only
+    jetson = board.Board(readonly=bool(args.list))
     headers = jetson.get_board_headers()
     dtbos = []
 
@@ -119,7 +135,7 @@ def main():
                 dtbos.append(dtbo)
 
     if len(dtbos) >= 1:
-        configure_dt(jetson, dtbos)
+        configure_dt(jetson, dtbos, args.merge, args.both_slots)
 
 
 if __name__ == '__main__':
@@ -22,6 +22,7 @@
 
 import argparse
 from Jetson import board
+from Utils import perf
 import sys
 import re
 
@@ -34,9 +35,14 @@ def main():
                       action='store_true')
     main.add_argument("-p", "--pin", help="Pin number")
     parser.add_argument("-n", "--header", help="Header number")
+    parser.add_argument("--profile", choices=perf.FORMATS,
+                        help="Report timing and command statistics on exit")
     args = parser.parse_args()
 
-    jetson = board.Board()
+    if args.profile:
+        perf.enable(args.profile)
+
+    jetson = board.Board(readonly=True)
     headers = jetson.get_board_headers()
 
     if len(headers) == 0:
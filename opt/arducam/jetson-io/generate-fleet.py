@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: Copyright (c) 2019-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import argparse
+import json
+import sys
+import time
+from Jetson import fleet
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        "Generate the jetson-io configuration of captured boards")
+    parser.add_argument("snapshots",
+                        help="Directory of the snapshots, one per "
+                             "subdirectory (see capture-snapshot.py)")
+    parser.add_argument("-p", "--profiles", required=True,
+                        help="JSON file of the profiles and the devices "
+                             "they apply to")
+    parser.add_argument("-o", "--out", required=True,
+                        help="Output directory, one subdirectory per device")
+    parser.add_argument("-j", "--jobs", type=int,
+                        help="Number of worker processes")
+    parser.add_argument("-m", "--minimal", action='store_true',
+                        help="Only include modified pins in the DTBO file(s)")
+    parser.add_argument("--json", action='store_true',
+                        help="Print the results as JSON")
+    args = parser.parse_args()
+
+    profiles = fleet.load_profiles(args.profiles)
+    snapshots = fleet.find_snapshots(args.snapshots)
+    if not snapshots:
+        raise RuntimeError("No snapshots found in %s!" % args.snapshots)
+
+    start = time.perf_counter()
+    results = fleet.generate(snapshots, profiles, args.out, args.jobs,
+                             args.minimal)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            total = result['times'].get('total', 0)
+            if result['ok']:
+                print("%-24s %-16s %8.1f ms  %s" %
+                      (result['device'], result['profile'], total,
+                       ', '.join(result['dtbos']) or 'no changes'))
+            else:
+                print("%-24s %-16s %8.1f ms  FAILED: %s" %
+                      (result['device'], result['profile'] or '-', total,
+                       result['error']))
+        busy = sum(r['times'].get('total', 0) for r in results)
+        print("%d devices in %.1f ms (%.1f ms of work, %.1fx)" %
+              (len(results), elapsed, busy, busy / elapsed if elapsed else 0))
+
+    if not all(result['ok'] for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -22,6 +22,7 @@
 # DEALINGS IN THE SOFTWARE.
 
 from curses import panel
+import concurrent.futures
 import curses
 from Jetson import board
 import os
@@ -36,12 +37,17 @@ class Window(object):
         self.w = w
         self.win = curses.newwin(h, w, y, x)
         self.panel = panel.new_panel(self.win)
+        # Text currently drawn by addstr_row(), per row, so that rows
+        # that have not changed are not drawn again
+        self.rows = {}
         self.win.clear()
         self.panel.hide()
         panel.update_panels()
 
     def clear(self):
-        self.win.clear()
+        # erase() rather than clear(), which repaints the whole screen
+        self.win.erase()
+        self.rows = {}
 
     def show(self):
         self.panel.top()
@@ -56,6 +62,21 @@ class Window(object):
         panel.update_panels()
         curses.doupdate()
 
+    def addstr_row(self, y, x, text, mode=curses.A_NORMAL):
+        row = (x, text, mode)
+        if self.rows.get(y) == row:
+            return
+        if y in self.rows:
+            prev_x, prev_text, _ = self.rows[y]
+            self.win.addstr(y, prev_x, ' ' * len(prev_text))
+        self.win.addstr(y, x, text, mode)
+        self.rows[y] = row
+
+    def addstr_row_centre(self, y, text, mode=curses.A_NORMAL):
+        text = text[:self.w - 2]
+        self.addstr_row(y, max(int((self.w / 2) - (len(text) / 2)), 1),
+                        text, mode)
+
     def addstr_centre(self, y, text, mode=curses.A_NORMAL):
         x = int((self.w / 2) - (len(text) / 2))
         if x > 0:
@@ -96,6 +117,17 @@ class MenuItemAction(MenuItem):
             self.action()
 
 
+class MenuItemLoading(MenuItemAction):
+    def __init__(self, name, exit_on_select, is_loaded, action, *args):
+        MenuItemAction.__init__(self, name, exit_on_select, action, *args)
+        self.is_loaded = is_loaded
+
+    def get_caption(self, maxwidth):
+        if self.is_loaded():
+            return self.name
+        return "%s (loading)" % self.name
+
+
 class MenuItemSelectable(MenuItemAction):
     def __init__(self, name, is_selected, action, *args):
         MenuItemAction.__init__(self, name, False, action, *args)
@@ -114,6 +146,12 @@ class Menu(object):
         self.title = title
         self.maxwidth = maxwidth
         self.index = 0
+        # First item shown, when there are more items than rows
+        self.top = 0
+        # Callable returning True while the items are still loading
+        self.busy = None
+        # Callable given any key not handled by the menu
+        self.on_key = None
 
     def up(self, items):
         while self.index > 0:
@@ -139,16 +177,29 @@ class Menu(object):
         return item.exit_on_select
 
     def update(self, items):
-        for index, item in enumerate(items):
-            if item.is_empty():
+        # Items are drawn from row 4, leaving the last row free for the
+        # scroll indicator; only the items in view are drawn
+        nrows = max(self.win.h - 5, 1)
+        if self.index < self.top:
+            self.top = self.index
+        elif self.index >= self.top + nrows:
+            self.top = self.index - nrows + 1
+        self.top = max(min(self.top, len(items) - nrows), 0)
+
+        self.win.addstr_row_centre(3, '^' if self.top > 0 else '')
+        for row in range(nrows):
+            index = self.top + row
+            if index >= len(items) or items[index].is_empty():
+                self.win.addstr_row_centre(4+row, '')
                 continue
 
-            caption = item.get_caption(self.maxwidth)
-
+            caption = items[index].get_caption(self.maxwidth)
             if index == self.index:
-                self.win.addstr_centre(4+index, caption, curses.A_REVERSE)
+                self.win.addstr_row_centre(4+row, caption, curses.A_REVERSE)
             else:
-                self.win.addstr_centre(4+index, caption)
+                self.win.addstr_row_centre(4+row, caption)
+        more = self.top + nrows < len(items)
+        self.win.addstr_row_centre(4+nrows, 'v' if more else '')
 
     def show(self, items):
         self.win.show()
@@ -156,6 +207,12 @@ class Menu(object):
 
         while True:
             self.update(items)
+            # While loading, redraw periodically so that the items are
+            # updated as their data arrives
+            if self.busy is not None and self.busy():
+                self.win.win.timeout(250)
+            else:
+                self.win.win.timeout(-1)
             key = self.win.win.getch()
 
             if key in [curses.KEY_ENTER, ord(' '), ord('\n')]:
@@ -168,29 +225,30 @@ class Menu(object):
             elif key == curses.KEY_DOWN:
                 self.down(items)
 
+            elif key != -1 and self.on_key is not None:
+                self.on_key(key)
+
         self.win.hide()
 
 
 class Header(object):
-    def __init__(self, screen, jetson, w):
+    def __init__(self, screen, jetson, w, max_h):
         self.rows = int(jetson.header.pin_count() / 2)
         self.jetson = jetson
 
-        # Get actual no. of display rows as rows where
-        # both pins are unavailable are not displayed
-        disp_rows = 0
+        # Only rows with at least one available pin are displayed, so
+        # that the UI display does not grow too long
+        self.pins = []
         for row in range(self.rows):
             pin = (row * 2) + 1
-            odd = self.jetson.header.pin_get_label(pin)
-            even = self.jetson.header.pin_get_label(pin + 1)
-
-            # Unlisted pins are not displayed so that the
-            # UI display does not grow too long
-            if (odd == 'NA') and (even == 'NA'):
-                continue
-            disp_rows += 1
+            if self.jetson.header.pin_get_label(pin) != 'NA' or \
+               self.jetson.header.pin_get_label(pin + 1) != 'NA':
+                self.pins.append(pin)
 
-        self.win = Window(screen, disp_rows + 2, w, 2, 2)
+        # Headers with more rows than fit are scrolled with PgUp/PgDn
+        self.disp_rows = max(min(len(self.pins), max_h - 2), 1)
+        self.top = 0
+        self.win = Window(screen, self.disp_rows + 2, w, 2, 2)
 
     def show(self):
         self.update()
@@ -199,24 +257,37 @@ class Header(object):
     def clear(self):
         self.win.clear()
 
-    def update(self):
-        self.clear()
-        disp_row = 0
+    def scroll(self, key):
+        if key == curses.KEY_NPAGE:
+            self.top += self.disp_rows
+        elif key == curses.KEY_PPAGE:
+            self.top -= self.disp_rows
+        else:
+            return
+        self.update()
+        self.win.win.refresh()
 
-        for row in range(self.rows):
-            pin = (row * 2) + 1
-            odd = self.jetson.header.pin_get_label(pin)
-            even = self.jetson.header.pin_get_label(pin + 1)
+    def update(self):
+        self.top = max(min(self.top, len(self.pins) - self.disp_rows), 0)
 
-            # Unlisted pins are not displayed so that the
-            # UI display does not grow too long
-            if (odd == 'NA') and (even == 'NA'):
+        for disp_row in range(self.disp_rows):
+            index = self.top + disp_row
+            if index >= len(self.pins):
+                self.win.addstr_row(2+disp_row, 0, '')
                 continue
 
+            pin = self.pins[index]
+            odd = self.jetson.header.pin_get_label(pin)
+            even = self.jetson.header.pin_get_label(pin + 1)
             text = "%s (%3d) .. (%3d) %s" % (odd, pin, pin + 1, even)
             col = int(self.win.w / 2) - len("%s (%3d) ." % (odd, pin))
-            self.win.win.addstr(2+disp_row, col, text)
-            disp_row += 1
+            self.win.addstr_row(2+disp_row, max(col, 0), text[:self.win.w])
+
+        if len(self.pins) > self.disp_rows:
+            first = self.pins[self.top]
+            last = self.pins[self.top + self.disp_rows - 1] + 1
+            self.win.addstr_row_centre(1, "pins %d-%d of %d (PgUp/PgDn)" %
+                                       (first, last, self.rows * 2))
 
 
 class HardwareAddonsMenu(object):
@@ -292,8 +363,10 @@ class PinGroupMenu(object):
 
 
 class HeaderMenu(object):
-    def __init__(self, screen, jetson, hdr, h, w):
+    def __init__(self, screen, main, loader, jetson, hdr, h, w):
         self.screen = screen
+        self.main = main
+        self.loader = loader
         self.jetson = jetson
         self.hdr = hdr
         self.h = h
@@ -303,7 +376,8 @@ class HeaderMenu(object):
         self.menu = None
 
     def _create_menu(self):
-        self.header = Header(self.screen, self.jetson, self.w)
+        # Leave room below the header for the menu title and its items
+        self.header = Header(self.screen, self.jetson, self.w, self.h - 10)
         self.pingroup = PinGroupMenu(self.screen, self.header,
                                      self.jetson, self.h, self.w)
         self.hw_addons = HardwareAddonsMenu(self.screen, self.header,
@@ -321,6 +395,7 @@ class HeaderMenu(object):
         self.subwin = Window(self.screen, win_h, self.w,
                              self.header.win.h + 2, 2)
         self.menu = Menu(self.subwin, self.title)
+        self.menu.on_key = self.header.scroll
 
         if self.jetson.hw_addon_get():
             caption = 'Configure for compatible hardware'
@@ -399,6 +474,8 @@ class HeaderMenu(object):
                     'temp' : True}
 
     def show(self):
+        self.main.wait(self.loader.headers[self.hdr],
+                       "Parsing %s" % self.hdr)
         self.jetson.set_active_header(self.hdr)
         if self.menu is None:
             self._create_menu()
@@ -407,7 +484,7 @@ class HeaderMenu(object):
             if self.go_back:
                 self.go_back = False
                 break
-            self.subwin.win.clear()
+            self.subwin.clear()
             self.header.show()
             if self.hw_addons.get() is not None:
                 self.menu.show(self.menu_save_hw_addons)
@@ -417,7 +494,7 @@ class HeaderMenu(object):
                 self.menu.show(self.menu_save_pingroup)
 
     def print_and_wait(self, messages, offset=2, spacing=2):
-        self.subwin.win.clear()
+        self.subwin.clear()
         self.subwin.addstr_centre(2, self.title)
         for message in messages:
             offset = offset + spacing
@@ -425,9 +502,31 @@ class HeaderMenu(object):
         self.subwin.win.getch()
 
 
+class Loader(object):
+    # Builds the Board and then parses its headers, the default header
+    # first, on a background thread so that the UI is drawn meanwhile
+    def __init__(self):
+        self.executor = concurrent.futures.ThreadPoolExecutor(1)
+        self.headers = {}
+        self.board = self.executor.submit(self._load_board)
+
+    def _load_board(self):
+        jetson = board.Board()
+        for hdr in jetson.get_board_headers():
+            self.headers[hdr] = self.executor.submit(jetson.load_header, hdr)
+        return jetson
+
+    def header_loaded(self, hdr):
+        return self.headers[hdr].done()
+
+    def busy(self):
+        return not all(f.done() for f in self.headers.values())
+
+
 class MainMenu(object):
-    def __init__(self, screen, main, h, w):
-        self.jetson = board.Board()
+    def __init__(self, screen, main, loader, h, w):
+        self.jetson = main.wait(loader.board,
+                                "Loading board configuration")
         self.headers = self.jetson.get_board_headers()
         self.main = main
         self.header_menu = {}
@@ -440,12 +539,16 @@ class MainMenu(object):
         title = "Select one of the following:"
         self.subwin = Window(screen, h, w, 2, 2)
         self.menu = Menu(self.subwin, title)
+        self.menu.busy = loader.busy
 
         for hdr in self.headers:
-            header_menu = HeaderMenu(screen, self.jetson, hdr, h, w)
+            header_menu = HeaderMenu(screen, main, loader, self.jetson, hdr,
+                                     h, w)
             self.header_menu[hdr] = header_menu
 
-            item = MenuItemAction('', True, header_menu.show)
+            item = MenuItemLoading('', True,
+                                   lambda hdr=hdr: loader.header_loaded(hdr),
+                                   header_menu.show)
             # Caption string is common to both menu_default and menu_save and
             # will be updated based on whether the pin state is default or not
             self.menu_default.append(item)
@@ -518,7 +621,7 @@ class MainMenu(object):
                 self.header_menu[hdr].discard()
 
     def exit(self, messages=[], reboot=False):
-        self.subwin.win.clear()
+        self.subwin.clear()
         if len(messages) > 0:
             self.main.print_and_wait(messages)
         if reboot:
@@ -528,7 +631,7 @@ class MainMenu(object):
 
     def show(self):
         while True:
-            self.subwin.win.clear()
+            self.subwin.clear()
             if self.headers_are_default():
                 self.menu.show(self.menu_default)
             else:
@@ -553,6 +656,27 @@ class MainWindow(object):
             self.main.win.getch()
             sys.exit(1)
 
+    def wait(self, future, message):
+        # Shows a progress indicator until the future is done and returns
+        # its result
+        spinner = '|/-\\'
+        text = None
+        index = 0
+        while True:
+            try:
+                result = future.result(timeout=0.1)
+                break
+            except concurrent.futures.TimeoutError:
+                pass
+            text = "%s %s" % (message, spinner[index % len(spinner)])
+            self.main.addstr_centre(self.main.h // 2, text)
+            self.main.show()
+            index += 1
+        if text:
+            self.main.addstr_centre(self.main.h // 2, ' ' * len(text))
+            self.main.show()
+        return result
+
     def print_and_wait(self, messages, offset=5, spacing=2):
         self.main.show()
         for message in messages:
@@ -569,7 +693,9 @@ class JetsonIO(object):
         self.win = MainWindow(stdscreen, height - 2, width - 10)
 
         try:
-            self.menu = MainMenu(stdscreen, self.win, height - 4, width - 12)
+            self.loader = Loader()
+            self.menu = MainMenu(stdscreen, self.win, self.loader,
+                                 height - 4, width - 12)
             self.menu.show()
         except KeyboardInterrupt:
             sys.exit(0)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: Copyright (c) 2019-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import argparse
+import json
+import socket
+import sys
+from Jetson import analytics
+from Jetson import board
+from Jetson import fleet
+
+
+def parse_where(where):
+    conditions = {}
+    for arg in where or []:
+        if '=' not in arg:
+            raise NameError("Invalid condition %s!" % arg)
+        column, values = arg.split('=', 1)
+        values = values.split(',')
+        if column in ['enabled', 'default', 'configurable']:
+            values = [int(v.lower() in ['1', 'true', 'yes']) for v in values]
+        elif column == 'pin':
+            values = [int(v) for v in values]
+        conditions[column] = values
+    return conditions
+
+
+def load_tables(files):
+    return analytics.concat(analytics.Table.load(f) for f in files)
+
+
+def print_rows(table, as_json):
+    rows = list(table.rows())
+    if as_json:
+        print(json.dumps(rows, indent=2))
+        return
+    for row in rows:
+        print("%-20s %-6s %3d %-24s %-14s %-8s %-8s %s" %
+              (row['unit'], row['header'], row['pin'], row['name'],
+               row['function'], 'enabled' if row['enabled'] else 'disabled',
+               'default' if row['default'] else 'modified', row['source']))
+
+
+def export(args):
+    if args.snapshots:
+        table = analytics.export_snapshots(
+            fleet.find_snapshots(args.snapshots), args.jobs)
+    else:
+        jetson = board.Board(readonly=True)
+        table = analytics.export_board(jetson, args.unit)
+    table.save(args.out)
+    print("Exported %d pins of %d units to %s." %
+          (len(table), len(table.distinct('unit')), args.out))
+
+
+def query(args):
+    table = load_tables(args.tables).filter(**parse_where(args.where))
+    if args.group_by:
+        counts = table.count_by(*args.group_by)
+        if args.json:
+            print(json.dumps([dict(zip(args.group_by, key), count=count)
+                              for key, count in sorted(counts.items())],
+                             indent=2))
+        else:
+            for key, count in sorted(counts.items()):
+                print("%6d  %s" % (count, ' '.join(map(str, key))))
+    else:
+        print_rows(table, args.json)
+    if len(table) == 0:
+        sys.exit(1)
+
+
+def drift(args):
+    table = load_tables(args.tables)
+    if args.approved:
+        reference = analytics.Table.load(args.approved)
+    else:
+        reference = table.filter(unit=args.reference)
+        if len(reference) == 0:
+            raise NameError("Unit %s not found!" % args.reference)
+    drifted = analytics.drift(table, reference)
+    if args.units:
+        for unit in drifted.distinct('unit'):
+            print(unit)
+    else:
+        print_rows(drifted, args.json)
+    if len(drifted):
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        "Export and query the pin configuration of many boards")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    parser_export = commands.add_parser(
+        'export', help="Export the pins of this board or of snapshots")
+    parser_export.add_argument("-o", "--out", required=True,
+                               help="Table file to write")
+    parser_export.add_argument("-s", "--snapshots",
+                               help="Directory of snapshots "
+                                    "(see capture-snapshot.py)")
+    parser_export.add_argument("-u", "--unit", default=socket.gethostname(),
+                               help="Name of this board "
+                                    "(default: %(default)s)")
+    parser_export.add_argument("-j", "--jobs", type=int,
+                               help="Number of worker processes")
+    parser_export.set_defaults(run=export)
+
+    parser_query = commands.add_parser(
+        'query', help="Filter and count the pins of tables")
+    parser_query.add_argument("tables", nargs='+', help="Table files")
+    parser_query.add_argument("-w", "--where", action='append',
+                              help="<column>=<value>[,<value>...], one of %s"
+                                   % ', '.join(analytics.COLUMNS))
+    parser_query.add_argument("-g", "--group-by", action='append',
+                              choices=analytics.COLUMNS,
+                              help="Count the pins by column")
+    parser_query.add_argument("--json", action='store_true',
+                              help="Print the result as JSON")
+    parser_query.set_defaults(run=query)
+
+    parser_drift = commands.add_parser(
+        'drift', help="List the pins differing from an approved unit")
+    parser_drift.add_argument("tables", nargs='+', help="Table files")
+    reference = parser_drift.add_mutually_exclusive_group(required=True)
+    reference.add_argument("-r", "--reference",
+                           help="Unit of the tables with the approved "
+                                "configuration")
+    reference.add_argument("-a", "--approved",
+                           help="Table file of the approved configuration")
+    parser_drift.add_argument("--units", action='store_true',
+                              help="Only list the units that drifted")
+    parser_drift.add_argument("--json", action='store_true',
+                              help="Print the result as JSON")
+    parser_drift.set_defaults(run=drift)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: Copyright (c) 2019-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import argparse
+import glob
+import json
+import os
+import sys
+from Jetson import cameras
+from Utils import cache
+from Utils import perf
+
+
+def _int(value):
+    return int(value, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        "Find the camera overlays by their sensors")
+    parser.add_argument("-d", "--dir", default='/boot/arducam/dts',
+                        help="Directory of the overlays "
+                             "(default: %(default)s)")
+    parser.add_argument("-s", "--sensor",
+                        help="Sensor name or compatible, e.g. imx477")
+    parser.add_argument("--bus", help="Base path of the I2C bus")
+    parser.add_argument("--addr", type=_int, help="I2C address")
+    parser.add_argument("--port", help="CSI port, e.g. serial_b")
+    parser.add_argument("--lanes", type=int, help="Number of CSI lanes")
+    parser.add_argument("--count", type=int,
+                        help="Number of sensors of the overlay")
+    parser.add_argument("--platform",
+                        help="Only overlays compatible with the platform, "
+                             "e.g. nvidia,p3768-0000+p3767-0000")
+    parser.add_argument("--json", action='store_true',
+                        help="Print the matching sensors as JSON")
+    parser.add_argument("--profile", choices=perf.FORMATS,
+                        help="Report timing and command statistics on exit")
+    args = parser.parse_args()
+
+    if args.profile:
+        perf.enable(args.profile)
+
+    dtbos = sorted(glob.glob(os.path.join(args.dir, '*.dtbo')))
+    if not dtbos:
+        raise RuntimeError("No overlays found in %s!" % args.dir)
+
+    with perf.span('camera index'):
+        index = cameras.get_index(dtbos)
+    cache.cameras.save()
+
+    rows = cameras.query(index, args.platform, args.count,
+                         sensor=args.sensor, i2c_bus=args.bus,
+                         i2c_addr=args.addr, csi_port=args.port,
+                         lanes=args.lanes)
+
+    if args.json:
+        out = []
+        for dtbo, sensor in rows:
+            out.append(dict(sensor, overlay=dtbo,
+                            name=index[dtbo]['overlay-name']))
+        print(json.dumps(out, indent=2))
+    else:
+        for dtbo, sensor in rows:
+            print("%-40s %-24s %-18s 0x%02x %-9s %-2s %s" %
+                  (index[dtbo]['overlay-name'], sensor['sensor'],
+                   sensor['compatible'] or '-', sensor['i2c_addr'] or 0,
+                   sensor['csi_port'] or '-', sensor['lanes'] or '-',
+                   sensor['i2c_bus']))
+
+    if not rows:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
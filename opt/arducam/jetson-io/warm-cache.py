@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: Copyright (c) 2019-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import argparse
+from Jetson import board
+from Utils import cache
+from Utils import perf
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        "Precompute the jetson-io overlay index, header pin templates and "
+        "camera index")
+    parser.add_argument("-d", "--dir", default='/boot/arducam/dts',
+                        help="Directory of the overlays "
+                             "(default: %(default)s)")
+    parser.add_argument("--clear", action='store_true',
+                        help="Drop the existing cache entries first")
+    parser.add_argument("--profile", choices=perf.FORMATS,
+                        help="Report timing and command statistics on exit")
+    args = parser.parse_args()
+
+    if args.profile:
+        perf.enable(args.profile)
+
+    if args.clear:
+        cache.overlays.clear()
+        cache.templates.clear()
+        cache.cameras.clear()
+
+    with perf.span('warm_cache'):
+        overlays, headers, sensors = board.warm_cache(args.dir)
+    print("Indexed %d overlays, %d header overlays and %d camera sensors "
+          "in %s." % (overlays, headers, sensors, cache.cache_dir))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: Copyright (c) 2019-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Benchmarks the jetson-io Board and Header operations against either a
+# synthetic device tree, generated with the requested number of pins,
+# overlays and tree depth, or the overlays shipped in boot/arducam/dts.
+# The sysfs device tree, debugfs pinctrl files and the nvbootctrl/lsblk
+# tools are replaced with fixtures and the trees are built in-process, so it
+# runs on any host.
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+_top = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+_jetson_io = os.path.join(_top, 'opt', 'arducam', 'jetson-io')
+_corpus = os.path.join(_top, 'boot', 'arducam', 'dts')
+sys.path.insert(0, _jetson_io)
+
+from Jetson import board
+from Linux import debugfs
+from Linux import dt
+from Utils import cache
+from Utils import dtc
+from Utils import fdt
+from Utils import lock
+import Headers
+
+
+COMPATIBLE = ['nvidia,jetson-io-bench', 'nvidia,tegra234']
+MODEL = 'Jetson IO Benchmark'
+PINMUX = 'pinmux@2430000'
+ROOTDEV = '179:1'
+
+_fake_tools = {
+    'nvbootctrl': 'echo 0',
+    'mountpoint': 'echo %s' % ROOTDEV,
+    'lsblk': 'case "$*" in *mountpoint*) echo "/ APP";; *) echo APP;; esac',
+    'mount': 'exit 0',
+    'umount': 'exit 0',
+}
+
+_extlinux = '''TIMEOUT 30
+DEFAULT primary
+
+MENU TITLE L4T boot options
+
+LABEL primary
+      MENU LABEL primary kernel
+      LINUX /boot/Image
+      INITRD /boot/initrd
+      APPEND ${cbootargs} root=/dev/mmcblk0p1 rw rootwait
+'''
+
+
+class Fixture(object):
+    def __init__(self, root):
+        self.root = root
+        self.bindir = os.path.join(root, 'bin')
+        self.sysfs = os.path.join(root, 'devicetree')
+        self.debugfs = os.path.join(root, 'debugfs')
+        self.devblock = os.path.join(root, 'dev-block')
+        self.mnt = os.path.join(root, 'mnt')
+        self.lockdir = os.path.join(root, 'lock')
+        self.cachedir = os.path.join(root, 'cache')
+        self.bootdir = os.path.join(root, 'dts')
+        self.extlinux = os.path.join(root, 'extlinux.conf')
+        self.workdir = os.path.join(root, 'work')
+
+        for d in self.bindir, self.sysfs, self.debugfs, self.devblock, \
+                 self.mnt, self.lockdir, \
+                 os.path.join(self.bootdir, 'dtb'), self.workdir:
+            os.makedirs(d)
+        open(os.path.join(self.devblock, ROOTDEV), 'w').close()
+
+        for tool, script in _fake_tools.items():
+            path = os.path.join(self.bindir, tool)
+            with open(path, 'w') as f:
+                f.write('#!/bin/sh\n%s\n' % script)
+            os.chmod(path, 0o755)
+
+        with open(self.extlinux, 'w') as f:
+            f.write(_extlinux)
+
+    def activate(self):
+        os.environ['PATH'] = self.bindir + os.pathsep + os.environ['PATH']
+        dt._dt_base_path = self.sysfs
+        debugfs.mountpoint = self.debugfs
+        board._dev_block_path = self.devblock
+        board._mnt_path = self.mnt
+        lock.lock_dir = self.lockdir
+        cache.cache_dir = self.cachedir
+        os.chdir(self.workdir)
+
+    def reset_extlinux(self):
+        with open(self.extlinux, 'w') as f:
+            f.write(_extlinux)
+
+    def write_sysfs(self, compat, model, pinmux, pinmux_aon=None):
+        def write(name, values):
+            path = os.path.join(self.sysfs, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(''.join('%s\0' % v for v in values))
+
+        write('compatible', compat)
+        write('model', [model])
+        write('__symbols__/pinmux', [pinmux])
+        if pinmux_aon:
+            write('__symbols__/pinmux_aon', [pinmux_aon])
+
+    def write_debugfs(self, dev, pins):
+        # pins: {name: (function, enabled, [functions])}
+        path = os.path.join(self.debugfs, 'pinctrl', '%s.pinmux' % dev)
+        os.makedirs(path, exist_ok=True)
+
+        with open(os.path.join(path, 'pinconf-groups'), 'w') as f:
+            f.write('Pin config settings per pin group\n')
+            f.write('Format: group (name): configs\n')
+            for index, name in enumerate(sorted(pins)):
+                function, enabled, _ = pins[name]
+                f.write('%d (%s):\n' % (index, name))
+                f.write('\tpull=0\n')
+                f.write('\ttristate=%d\n' % (0 if enabled else 1))
+                f.write('\tenable-input=%d\n' % (1 if enabled else 0))
+                f.write('\tgpio-mode=1\n')
+                f.write('\tfunction=%s\n' % function)
+
+        functions = {}
+        for name in pins:
+            for function in pins[name][2]:
+                functions.setdefault(function, []).append(name)
+        with open(os.path.join(path, 'pinmux-functions'), 'w') as f:
+            for index, function in enumerate(sorted(functions)):
+                for name in sorted(functions[function]):
+                    f.write('function %d: %s, groups = [ %s ]\n' %
+                            (index, function, name))
+
+    def write(self, root, out):
+        fdt.save(fdt.Fdt(root), out)
+
+
+def _node(name, props=None, children=None):
+    # props: {name: str, [str] or int}
+    node = fdt.Node(name)
+    for prop, value in (props or {}).items():
+        if isinstance(value, int):
+            node.props[prop] = fdt.encode_value('u', [str(value)])
+        elif isinstance(value, str):
+            node.props[prop] = fdt.encode_strings([value])
+        else:
+            node.props[prop] = fdt.encode_strings(value)
+    for child in children or []:
+        node.children[child.name] = child
+    return node
+
+
+def _nest(levels, children):
+    # Wraps children in 'levels' nested nodes to add depth to the tree
+    for level in reversed(range(levels)):
+        children = [_node('level%d' % level, children=children)]
+    return children
+
+
+def synthesize(fixture, hdr_def, npins, noverlays, depth):
+    prefix = hdr_def.prefix
+    numbers = [n for n in range(1, hdr_def.pin_count + 1)
+               if n not in hdr_def.static_pins][:npins]
+    groups = {}
+    pins = {}
+    for index, num in enumerate(numbers):
+        name = 'bench_pin%03d' % num
+        group = 'bfn%d' % (index // 4)
+        functions = ['rsvd0', 'gp', group]
+        if index % 8 == 0:
+            functions.append('balt%d' % (index // 8))
+        # Enabled pins are muxed to their group function, others are unused
+        enabled = index % 2 == 0
+        pins[name] = (group if enabled else 'rsvd0', enabled, functions)
+        groups.setdefault(group, []).append((num, name))
+
+    pinmux_path = '/' + '/'.join(['bus@0'] +
+                                 ['level%d' % l for l in range(depth)] +
+                                 [PINMUX])
+    fixture.write_sysfs(COMPATIBLE, MODEL, pinmux_path)
+    fixture.write_debugfs(PINMUX.split('@')[1], pins)
+
+    fixture.write(_node('', {'compatible': COMPATIBLE, 'model': MODEL}, [
+        _node('bus@0', children=_nest(depth, [
+            _node(PINMUX, {'phandle': 1})])),
+        _node('__symbols__', {'pinmux': pinmux_path})]),
+        os.path.join(fixture.bootdir, 'dtb', 'bench.dtb'))
+
+    def pin_node(num, name, function, suffix=''):
+        return _node('%s-pin%d%s' % (prefix, num, suffix), {
+            'nvidia,pins': name,
+            'nvidia,function': function,
+            'nvidia,pin-label': function,
+            'nvidia,tristate': 0,
+            'nvidia,enable-input': 1})
+
+    def overlay(props, nodes):
+        # Same layout as compiled by 'dtc -@' from a /plugin/ source with
+        # 'target = <&pinmux>'
+        pinmux = '%s-pinmux' % prefix
+        props['compatible'] = COMPATIBLE[0]
+        return _node('', props, [
+            _node('fragment@0', {'target': 0xffffffff}, [
+                _node('__overlay__', children=[_node(pinmux, children=nodes)])
+            ]),
+            _node('__symbols__', {
+                'jetson_io_pinmux': '/fragment@0/__overlay__/%s' % pinmux}),
+            _node('__fixups__', {'pinmux': '/fragment@0:target:0'})])
+
+    nodes = []
+    for num in numbers:
+        name = 'bench_pin%03d' % num
+        functions = pins[name][2]
+        nodes.append(pin_node(num, name, functions[2]))
+        if len(functions) > 3:
+            nodes.append(pin_node(num, name, functions[3], 'alt'))
+    fixture.write(overlay({'overlay-name': hdr_def.name}, nodes),
+                  os.path.join(fixture.bootdir, 'bench-%s.dtbo' % prefix))
+
+    names = sorted(groups)
+    for index in range(noverlays):
+        group = names[index % len(names)]
+        nodes = [pin_node(num, name, group) for num, name in groups[group]]
+        props = {'jetson-header-name': hdr_def.name,
+                 'overlay-name': 'Bench Addon %d' % index}
+        fixture.write(overlay(props, _nest(depth, nodes)),
+                      os.path.join(fixture.bootdir,
+                                   'bench-addon-%d.dtbo' % index))
+
+
+def load_corpus(fixture, corpus, dtb_name):
+    if dtb_name is None:
+        dtbs = sorted(glob.glob(os.path.join(corpus, 'dtb', '*.dtb')))
+        if not dtbs:
+            raise RuntimeError("No DTB found in %s!" % corpus)
+        dtb = dtbs[0]
+    else:
+        dtb = os.path.join(corpus, 'dtb', dtb_name)
+
+    shutil.copy(dtb, os.path.join(fixture.bootdir, 'dtb'))
+    for dtbo in glob.glob(os.path.join(corpus, '*.dtbo')):
+        shutil.copy(dtbo, fixture.bootdir)
+
+    compat = dtc.get_compatible(dtb).split()
+    model = dtc.get_model(dtb)
+    pinmux = dtc.get_prop_value(dtb, '/__symbols__', 'pinmux', 0)
+    pinmux_aon = dtc.get_prop_value(dtb, '/__symbols__', 'pinmux_aon', 0)
+    fixture.write_sysfs(compat, model, pinmux, pinmux_aon)
+
+    # Every pin referenced by a compatible overlay gets all the functions
+    # those overlays use for it
+    functions = {}
+    for dtbo in dtc.find_compatible_dtbo_files(compat, fixture.bootdir):
+        for node in dtc.find_nodes_with_prop(dtbo, '/', 'nvidia,pins'):
+            name = dtc.get_prop_value(dtbo, node, 'nvidia,pins', 0)
+            function = dtc.get_prop_value(dtbo, node, 'nvidia,function', 0)
+            functions.setdefault(name, set(['rsvd0']))
+            if function:
+                functions[name].add(function)
+    # As in synthesize(), every other pin is unused, so that enabling a
+    # pin group changes the configuration and there is a DTBO to generate
+    pins = {}
+    for index, name in enumerate(sorted(functions)):
+        funcs = sorted(functions[name])
+        current = [f for f in funcs if 'rsvd' not in f] or funcs
+        if index % 2 == 0:
+            pins[name] = (current[0], True, funcs)
+        else:
+            pins[name] = ('rsvd0', False, funcs)
+
+    fixture.write_debugfs(pinmux.split('pinmux@')[1], pins)
+    if pinmux_aon:
+        fixture.write_debugfs(pinmux_aon.split('pinmux@')[1], {})
+
+    return os.path.basename(dtb)
+
+
+def measure(fn, runs, setup=None):
+    times = []
+    for _ in range(runs):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return {'min': min(times), 'median': statistics.median(times),
+            'mean': statistics.mean(times), 'runs': runs}
+
+
+def run_benchmarks(fixture, runs):
+    results = {}
+    new_board = lambda: board.Board(fixture.bootdir, fixture.extlinux)
+
+    results['Board()'] = measure(new_board, runs)
+    jetson = new_board()
+
+    for hdr in jetson.get_board_headers():
+        def reset_header():
+            jetson.board_headers[hdr].header = None
+        results['set_active_header %s' % hdr] = measure(
+            lambda: jetson.set_active_header(hdr), runs, reset_header)
+
+        addons = jetson.hw_addon_get()
+        if addons:
+            results['hw_addon_load %s' % hdr] = measure(
+                lambda: jetson.hw_addon_load(addons[0]), runs)
+
+        # The first pin group that changes the default configuration
+        for group in jetson.header.pingroups_available():
+            jetson.header.pins_set_default()
+            jetson.header.pingroup_enable(group)
+            if not jetson.header.pins_are_default():
+                break
+        else:
+            continue
+        dtbo = os.path.join(fixture.bootdir,
+                            'jetson-io-%s-user-custom.dtbo' %
+                            jetson.header.prefix)
+
+        def remove_dtbo():
+            if os.path.exists(dtbo):
+                os.remove(dtbo)
+        results['create_dtbo_for_header %s' % hdr] = measure(
+            jetson.create_dtbo_for_header, runs, remove_dtbo)
+        results['configure_overlays %s' % hdr] = measure(
+            lambda: jetson.configure_overlays([dtbo]), runs,
+            fixture.reset_extlinux)
+
+    return results
+
+
+def measure_startup(runs):
+    # Startup cost of the tools, dominated by module imports
+    script = os.path.join(_jetson_io, 'config-by-pin.py')
+    return measure(lambda: subprocess.check_call(
+        [sys.executable, script, '--help'], stdout=subprocess.DEVNULL), runs)
+
+
+def _git_revision():
+    try:
+        out = subprocess.check_output(['git', '-C', _top, 'rev-parse',
+                                       '--short', 'HEAD'],
+                                      stderr=subprocess.DEVNULL)
+        return out.decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _previous(results_file, params):
+    if not results_file or not os.path.exists(results_file):
+        return None
+    previous = None
+    with open(results_file, 'r') as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry['params'] == params:
+                previous = entry
+    return previous
+
+
+def main():
+    parser = argparse.ArgumentParser("Benchmark jetson-io operations")
+    parser.add_argument("--pins", type=int, default=28,
+                        help="Configurable pins on the synthetic header")
+    parser.add_argument("--overlays", type=int, default=8,
+                        help="Number of synthetic HW addon overlays")
+    parser.add_argument("--depth", type=int, default=2,
+                        help="Extra levels of nodes in the synthetic trees")
+    parser.add_argument("--header", default='hdr40',
+                        help="Prefix of the header to synthesize")
+    parser.add_argument("--corpus", nargs='?', const=_corpus,
+                        help="Benchmark the overlays in a dts directory "
+                             "(default: %(const)s)")
+    parser.add_argument("--dtb", help="Base DTB of the corpus to use")
+    parser.add_argument("--runs", type=int, default=5,
+                        help="Number of runs per operation")
+    parser.add_argument("--results",
+                        help="Append the results to this JSON lines file")
+    parser.add_argument("--keep", action='store_true',
+                        help="Keep the generated fixtures")
+    parser.add_argument("--import-budget", type=float, metavar='MS',
+                        help="Fail if the median startup time of "
+                             "config-by-pin.py exceeds this budget")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='jetson-io-bench-')
+    cwd = os.getcwd()
+    try:
+        fixture = Fixture(root)
+        if args.corpus:
+            dtb = load_corpus(fixture, args.corpus, args.dtb)
+            params = {'corpus': os.path.abspath(args.corpus), 'dtb': dtb}
+        else:
+            hdr_defs = [h for h in Headers.get_headers(COMPATIBLE)
+                        if h.prefix == args.header]
+            if not hdr_defs:
+                raise NameError("Unknown header %s!" % args.header)
+            synthesize(fixture, hdr_defs[0], args.pins, args.overlays,
+                       args.depth)
+            params = {'header': args.header, 'pins': args.pins,
+                      'overlays': args.overlays, 'depth': args.depth}
+        params['runs'] = args.runs
+
+        results = {'config-by-pin.py --help': measure_startup(args.runs)}
+        fixture.activate()
+        results.update(run_benchmarks(fixture, args.runs))
+    finally:
+        os.chdir(cwd)
+        if args.keep:
+            print("Fixtures kept in %s" % root)
+        else:
+            shutil.rmtree(root)
+
+    previous = _previous(args.results, params)
+    print("%-50s %10s %10s %10s" % ('Operation', 'Min (ms)', 'Median',
+                                    'Change'))
+    for op, res in results.items():
+        change = ''
+        if previous and op in previous['results']:
+            before = previous['results'][op]['median']
+            if before:
+                change = '%+.1f%%' % ((res['median'] - before) * 100 / before)
+        print("%-50s %10.2f %10.2f %10s" % (op, res['min'], res['median'],
+                                            change))
+
+    if args.results:
+        entry = {'date': datetime.datetime.now().isoformat(),
+                 'revision': _git_revision(),
+                 'python': platform.python_version(),
+                 'host': platform.node(),
+                 'params': params,
+                 'results': results}
+        with open(args.results, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+
+    if args.import_budget is not None:
+        startup = results['config-by-pin.py --help']['median']
+        if startup > args.import_budget:
+            print("Startup time %.1f ms exceeds the budget of %.1f ms!" %
+                  (startup, args.import_budget))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
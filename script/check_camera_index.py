@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+# SPDX-FileCopyrightText: Copyright (c) 2019-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Checks the camera index against the overlays shipped in boot/arducam/dts.
+# Covers overlays that add their sensors, overlays that only amend sensors
+# of the base DTB (no reg or compatible) and overlays whose fragments only
+# enable the sensor they target, next to the muxes and expanders that must
+# not be indexed. Exits non-zero if any overlay does not match.
+
+import argparse
+import os
+import sys
+
+_top = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+_jetson_io = os.path.join(_top, 'opt', 'arducam', 'jetson-io')
+_corpus = os.path.join(_top, 'boot', 'arducam', 'dts')
+sys.path.insert(0, _jetson_io)
+
+from Jetson import cameras
+
+
+# {overlay: [(sensor, mux channel, address, lanes, csi port)]}
+_expected = {
+    'tegra234-p3767-camera-p3768-imx477-dual.dtbo': [
+        ('rbpcv3_imx477_a@1a', 'cam_i2cmux/i2c@0', 0x1a, 2, 'serial_b'),
+        ('rbpcv3_imx477_c@1a', 'cam_i2cmux/i2c@1', 0x1a, 2, 'serial_c'),
+    ],
+    'tegra234-p3737-camera-imx390-addr-0x21-overlay.dtbo': [
+        ('imx390_a@21', 'tca9546@70/i2c@0', 0x21, None, None),
+    ],
+    'tegra234-p3737-camera-e3331-overlay.dtbo': [
+        ('imx318_a@10', 'tca9546@70/i2c@0', 0x10, None, None),
+    ],
+    'tegra234-p3737-camera-e3333-overlay.dtbo': [
+        ('ov5693_%s@36' % s, 'tca9548@77/i2c@%d' % i, 0x36, None, None)
+        for i, s in enumerate('abcdeg')
+    ],
+    'tegra234-p3737-camera-dual-imx274-overlay.dtbo': [
+        ('imx274_a@1a', 'tca9546@70/i2c@0', 0x1a, None, None),
+        ('imx274_c@1a', 'tca9546@70/i2c@1', 0x1a, None, None),
+    ],
+    'tegra234-p3737-camera-imx185-overlay.dtbo': [
+        ('imx185_a@1a', 'tca9546@70/i2c@0', 0x1a, None, None),
+    ],
+    'tegra234-p3737-camera-dual-hawk-ar0234-e3653-overlay.dtbo': [
+        ('dual_hawk_a@18', 'tca9546@70/i2c@0', 0x18, None, None),
+        ('dual_hawk_b@10', 'tca9546@70/i2c@0', 0x10, None, None),
+        ('dual_hawk_c@18', 'tca9546@70/i2c@1', 0x18, None, None),
+        ('dual_hawk_d@10', 'tca9546@70/i2c@1', 0x10, None, None),
+    ],
+}
+
+
+def _find(corpus, name):
+    for root, _, files in os.walk(corpus):
+        if name in files:
+            return os.path.join(root, name)
+    return None
+
+
+def _describe(sensor):
+    return (sensor['sensor'],
+            '/'.join(sensor['i2c_bus'].split('/')[-2:]),
+            sensor['i2c_addr'], sensor['lanes'], sensor['csi_port'])
+
+
+def main():
+    parser = argparse.ArgumentParser("Check the camera index")
+    parser.add_argument('-c', '--corpus', default=_corpus,
+                        help='Directory with the shipped overlays')
+    args = parser.parse_args()
+
+    failed = 0
+    for name, expected in sorted(_expected.items()):
+        dtbo = _find(args.corpus, name)
+        if dtbo is None:
+            print("FAIL %s: not found" % name)
+            failed += 1
+            continue
+        found = [_describe(s) for s in cameras.get_sensors(dtbo)]
+        if sorted(found) != sorted(expected):
+            print("FAIL %s:\n  expected %s\n  found    %s" %
+                  (name, sorted(expected), sorted(found)))
+            failed += 1
+        else:
+            print("ok   %s: %d sensor(s)" % (name, len(found)))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,54 +1,233 @@
 #!/usr/bin/env python3
+import argparse
+import concurrent.futures
+import hashlib
 import os
 import shutil
-import subprocess
+import stat
+import sys
 
-def copy_arducam_folder():
+SOURCE_FOLDER = "/home/dk_jetson/arducam_tof/driver/boot/arducam"
+DEST_FOLDER = "/boot/arducam"
+
+
+def file_digest(path):
+    """
+    Returns the SHA-256 digest of a file.
+    """
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def scan_folder(folder):
+    """
+    Returns the entries below folder as {relative path: os.stat_result},
+    without following symbolic links.
+    """
+    entries = {}
+    for dirpath, dirnames, filenames in os.walk(folder):
+        for name in dirnames + filenames:
+            path = os.path.join(dirpath, name)
+            entries[os.path.relpath(path, folder)] = os.lstat(path)
+    return entries
+
+
+def is_unchanged(src, dst, src_stat, dst_stat):
+    """
+    Checks whether dst already holds the contents of src. Regular files
+    are only hashed when their sizes match.
+    """
+    if dst_stat is None:
+        return False
+    if stat.S_IFMT(src_stat.st_mode) != stat.S_IFMT(dst_stat.st_mode):
+        return False
+    if stat.S_ISLNK(src_stat.st_mode):
+        return os.readlink(src) == os.readlink(dst)
+    if src_stat.st_size != dst_stat.st_size:
+        return False
+    return file_digest(src) == file_digest(dst)
+
+
+def copy_file(src, dst):
+    """
+    Copies src to dst through a temporary file in the destination folder,
+    which is renamed over dst once complete, so that an interrupted copy
+    never leaves a partially written file behind.
+    """
+    temp = os.path.join(os.path.dirname(dst),
+                        ".%s.%d.tmp" % (os.path.basename(dst), os.getpid()))
+    try:
+        if os.path.islink(src):
+            os.symlink(os.readlink(src), temp)
+        else:
+            with open(src, 'rb') as fin, open(temp, 'wb') as fout:
+                copy_data(fin.fileno(), fout.fileno(),
+                          os.fstat(fin.fileno()).st_size)
+                os.fsync(fout.fileno())
+            shutil.copystat(src, temp)
+        os.replace(temp, dst)
+    finally:
+        if os.path.lexists(temp):
+            os.remove(temp)
+
+
+def copy_data(fd_in, fd_out, size):
+    """
+    Copies size bytes between file descriptors in the kernel, with
+    copy_file_range() or else sendfile(), falling back to read/write.
+    """
+    for copy in (getattr(os, 'copy_file_range', None), os.sendfile):
+        if copy is None:
+            continue
+        copied = 0
+        try:
+            while copied < size:
+                if copy is os.sendfile:
+                    n = copy(fd_out, fd_in, copied, size - copied)
+                else:
+                    n = copy(fd_in, fd_out, size - copied, copied, copied)
+                if n == 0:
+                    break
+                copied += n
+            return
+        except OSError:
+            if copied:
+                raise
+    os.lseek(fd_in, 0, os.SEEK_SET)
+    while True:
+        chunk = os.read(fd_in, 1 << 20)
+        if not chunk:
+            break
+        os.write(fd_out, chunk)
+
+
+def sync_folder(source_folder, dest_folder, jobs=None, dry_run=False):
     """
-    Copies the /boot/arducam folder to the filesystem /boot/arducam folder.
-    Requires sudo permissions to write to /boot.
+    Makes dest_folder an exact copy of source_folder, copying only the
+    files whose contents differ. Source and destination files are hashed
+    in parallel and files no longer in the source are removed last.
+    Returns (copied, unchanged, removed) lists of relative paths and the
+    number of bytes copied and not copied.
     """
-    source_folder = "/home/dk_jetson/arducam_tof/driver/boot/arducam"
-    dest_folder = "/boot/arducam"
-    
-    print(f"Attempting to copy {source_folder} to {dest_folder}...")
-    
+    src_entries = scan_folder(source_folder)
+    dst_entries = scan_folder(dest_folder) if os.path.isdir(dest_folder) \
+                  else {}
+
+    dirs = sorted(p for p, st in src_entries.items()
+                  if stat.S_ISDIR(st.st_mode))
+    files = sorted(p for p, st in src_entries.items()
+                   if not stat.S_ISDIR(st.st_mode))
+
+    with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+        checks = dict((p, executor.submit(
+            is_unchanged, os.path.join(source_folder, p),
+            os.path.join(dest_folder, p), src_entries[p],
+            dst_entries.get(p))) for p in files)
+        unchanged = [p for p in files if checks[p].result()]
+    copied = [p for p in files if p not in unchanged]
+    removed = sorted((p for p in dst_entries if p not in src_entries),
+                     reverse=True)
+
+    bytes_copied = sum(src_entries[p].st_size for p in copied)
+    bytes_saved = sum(src_entries[p].st_size for p in unchanged)
+    if dry_run:
+        return copied, unchanged, removed, bytes_copied, bytes_saved
+
+    for p in [''] + dirs:
+        path = os.path.join(dest_folder, p)
+        # A file or link in the way of a directory is replaced
+        if os.path.lexists(path) and (os.path.islink(path) or
+                                      not os.path.isdir(path)):
+            os.remove(path)
+        os.makedirs(path, exist_ok=True)
+
+    for p in copied:
+        dst = os.path.join(dest_folder, p)
+        if os.path.isdir(dst) and not os.path.islink(dst):
+            shutil.rmtree(dst)
+        copy_file(os.path.join(source_folder, p), dst)
+
+    # Stale entries go last, so an interrupted sync only leaves extra files;
+    # the reverse order removes the contents of a directory before itself
+    for p in removed:
+        path = os.path.join(dest_folder, p)
+        if not os.path.lexists(path):
+            continue
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    os.sync()
+
+    return copied, unchanged, removed, bytes_copied, bytes_saved
+
+
+def copy_arducam_folder(source_folder=SOURCE_FOLDER, dest_folder=DEST_FOLDER,
+                        jobs=None, dry_run=False):
+    """
+    Syncs the /boot/arducam folder to the filesystem /boot/arducam folder.
+    Requires root permissions to write to /boot.
+    """
+    print(f"Attempting to sync {source_folder} to {dest_folder}...")
+
     # Check if source folder exists
-    if not os.path.exists(source_folder):
+    if not os.path.isdir(source_folder):
         print(f"Error: Source folder {source_folder} does not exist!")
         return False
-    
+
     try:
-        # Using sudo with shell commands since Python might not have permissions to write to /boot
-        
-        # Check if destination folder exists and remove it
-        if os.path.exists(dest_folder):
-            print(f"Removing existing {dest_folder}...")
-            subprocess.run(["sudo", "rm", "-rf", dest_folder], check=True)
-        
-        # Create destination directory
-        print(f"Creating new {dest_folder}...")
-        subprocess.run(["sudo", "mkdir", "-p", dest_folder], check=True)
-        
-        # Copy contents of source folder to destination folder
-        print(f"Copying files from {source_folder} to {dest_folder}...")
-        subprocess.run(["sudo", "cp", "-R", f"{source_folder}/.", dest_folder], check=True)
-        
-        print(f"Successfully copied {source_folder} to {dest_folder}")
+        copied, unchanged, removed, bytes_copied, bytes_saved = \
+            sync_folder(source_folder, dest_folder, jobs, dry_run)
+
+        verb = "Would copy" if dry_run else "Copied"
+        for p in copied:
+            print(f"  {verb} {p}")
+        verb = "Would remove" if dry_run else "Removed"
+        for p in removed:
+            print(f"  {verb} {p}")
+
+        print(f"{len(copied)} file(s) copied ({bytes_copied} bytes), "
+              f"{len(unchanged)} unchanged ({bytes_saved} bytes saved), "
+              f"{len(removed)} removed")
         return True
-    
-    except subprocess.CalledProcessError as e:
-        print(f"Error executing command: {e}")
-        return False
+
     except Exception as e:
         print(f"An error occurred: {e}")
         return False
 
-if __name__ == "__main__":
-    print("Starting ARDUCAM folder copy operation...")
-    success = copy_arducam_folder()
-    
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sync the Arducam boot files to /boot/arducam")
+    parser.add_argument("--source", default=SOURCE_FOLDER,
+                        help="Source folder (default: %(default)s)")
+    parser.add_argument("--dest", default=DEST_FOLDER,
+                        help="Destination folder (default: %(default)s)")
+    parser.add_argument("-j", "--jobs", type=int,
+                        help="Number of files hashed in parallel")
+    parser.add_argument("-n", "--dry-run", action='store_true',
+                        help="Only report what would be changed")
+    args = parser.parse_args()
+
+    # Writing to /boot needs root, so rerun the script with sudo
+    dest_parent = os.path.dirname(os.path.abspath(args.dest))
+    if not args.dry_run and os.geteuid() != 0 and \
+       not os.access(dest_parent, os.W_OK):
+        os.execvp("sudo", ["sudo", sys.executable] + sys.argv)
+
+    print("Starting ARDUCAM folder sync operation...")
+    success = copy_arducam_folder(args.source, args.dest, args.jobs,
+                                  args.dry_run)
+
     if success:
-        print("Copy operation completed successfully!")
+        print("Sync operation completed successfully!")
     else:
-        print("Copy operation failed!")
\ No newline at end of file
+        print("Sync operation failed!")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()